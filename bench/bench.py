@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+
+from typing import List, Dict, Tuple, NamedTuple, Optional
+import argparse
+import filecmp
+import os
+import random
+import subprocess
+import sys
+import time
+
+
+# Paths
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+MAIN_PY = os.path.join(ROOT_DIR, "main.py")
+CONV_DIR = os.path.join(ROOT_DIR, "conv")
+MOCK_UDPIPE_DIR = os.path.join(BENCH_DIR, "mock_udpipe")
+
+sys.path.insert(0, ROOT_DIR)
+from main import SOURCE_PREFS, GLOBAL_COLUMNS_KEY  # noqa: E402
+
+
+#################################################
+# SYNTHETIC DATA
+#################################################
+
+
+# Columns of the generated .cupt files
+CUPT_COLUMNS = "ID FORM LEMMA UPOS XPOS FEATS HEAD DEPREL DEPS MISC" \
+    " PARSEME:MWE"
+
+# MWE categories and their relative frequencies
+MWE_CATS = [("VID", 3), ("LVC.full", 3), ("IRV", 3), ("LVC.cause", 1),
+            ("MVC", 1)]
+
+# Forms/lemmas used for tokens which are not numerals or qub's
+WORDS = ["dom", "kot", "pies", "miasto", "rok", "człowiek", "sprawa",
+         "duży", "nowy", "polski", "mieć", "być", "robić", "mówić", "iść",
+         "w", "na", "z", "do", "i", "że", "się", "to", "nie", "bardzo"]
+
+# Numerals
+NUM_WORDS = ["dwa", "trzy", "pięć", "dziesięć", "sto"]
+NUM_DIGITS = ["2", "15", "1999", "3,5", "10-12"]
+
+# Share of the PARSEME-PL sentences which are also in UD PDB, and of PCC
+PDB_SHARE = 0.2
+PCC_SHARE = 0.15
+
+
+class Tag(NamedTuple):
+    xpos: str
+    upos: str
+    feats: str
+
+
+def load_tags(conv_dir: str) -> Tuple[List[Tag], List[Tuple[str, Tag]]]:
+    """Load realistic tags from the conversion maps.
+
+    Returns the XPOS-based tags and the (lemma, tag) pairs of qub's.
+    """
+    def load(name):
+        with open(os.path.join(conv_dir, name), encoding="utf-8") as f:
+            return dict(line.rstrip("\n").split("\t")[:2] for line in f)
+    upos_map = load("upos_conv.txt")
+    feat_map = load("feat_conv.txt")
+    tags = [Tag(x, upos_map[x], feat_map[x]) for x in sorted(upos_map)]
+    qubs = []
+    with open(os.path.join(conv_dir, "qub_conv.txt"), encoding="utf-8") as f:
+        for line in f:
+            lemma, upos, xpos, feats = line.rstrip("\n").split("\t")
+            qubs.append((lemma, Tag(xpos, upos, feats)))
+    return tags, qubs
+
+
+def gen_sentence(rnd: random.Random, sent_id: str, tags: List[Tag],
+                 qubs: List[Tuple[str, Tag]]) -> List[str]:
+    """Generate the lines of a single synthetic sentence."""
+    length = max(1, min(80, int(rnd.gammavariate(2.0, 8.0))))
+    toks = []
+    for i in range(1, length + 1):
+        r = rnd.random()
+        if r < 0.05:
+            lemma, tag = rnd.choice(qubs)
+            form = lemma
+        elif r < 0.1:
+            form = rnd.choice(NUM_DIGITS + NUM_WORDS)
+            lemma = form
+            feats = "Case=Nom|NumForm=Digit" if form[0].isdigit() \
+                else "Case=Nom|NumForm=Word"
+            tag = Tag("num:pl:nom:m3:rec", "NUM", feats)
+        else:
+            form = lemma = rnd.choice(WORDS)
+            tag = rnd.choice(tags)
+        head = 0 if i == 1 else rnd.randrange(1, i)
+        deprel = "root" if i == 1 else "dep"
+        toks.append([str(i), form, lemma, tag.upos, tag.xpos, tag.feats,
+                     str(head), deprel, "_", "_", "*"])
+    # MWE annotation
+    if length > 1 and rnd.random() < 0.3:
+        cats, weights = zip(*MWE_CATS)
+        cat = rnd.choices(cats, weights)[0]
+        first = rnd.randrange(0, length - 1)
+        toks[first][10] = "1:" + cat
+        toks[first + 1][10] = "1"
+    text = " ".join(tok[1] for tok in toks)
+    lines = [
+        f"# source_sent_id = . . {sent_id}",
+        f"# orig_file_sentence = {sent_id}#{rnd.randrange(1, 50)}",
+        f"# sent_id = {sent_id}",
+        f"# text = {text}",
+    ]
+    lines.extend("\t".join(tok) for tok in toks)
+    return lines
+
+
+class Dataset(NamedTuple):
+    cupt_path: str
+    pdb_path: str
+    sents: int
+    tokens: int
+
+
+def gen_dataset(out_dir: str, sents: int, seed: int) -> Dataset:
+    """Generate a synthetic PARSEME-PL-like .cupt file of the given size,
+    together with a UD PDB-like .conllu file covering some of its sentences.
+    """
+    rnd = random.Random(seed)
+    tags, qubs = load_tags(CONV_DIR)
+    nkjp_prefs = sorted(SOURCE_PREFS)
+    cupt_path = os.path.join(out_dir, f"synth-{sents}.cupt")
+    pdb_path = os.path.join(out_dir, f"synth-{sents}-pdb.conllu")
+    tokens = 0
+    with open(cupt_path, "w", encoding="utf-8") as cupt, \
+            open(pdb_path, "w", encoding="utf-8") as pdb:
+        cupt.write(f"# {GLOBAL_COLUMNS_KEY} = {CUPT_COLUMNS}\n")
+        for n in range(sents):
+            if rnd.random() < PCC_SHARE:
+                text_id = f"pcc{n // 40}"
+            else:
+                text_id = f"{rnd.choice(nkjp_prefs)}{n // 40:06d}"
+            sent_id = f"{text_id}_morph_{n % 40 + 1}.{n}-s"
+            lines = gen_sentence(rnd, sent_id, tags, qubs)
+            tokens += sum(1 for line in lines if not line.startswith("#"))
+            cupt.write("\n".join(lines) + "\n\n")
+            if not text_id.startswith("pcc") and rnd.random() < PDB_SHARE:
+                # Same sentence in PDB (.conllu, no MWE column)
+                pdb_lines = [
+                    line if line.startswith("#")
+                    else "\t".join(line.split("\t")[:10])
+                    for line in lines
+                ]
+                pdb.write("\n".join(pdb_lines) + "\n\n")
+    return Dataset(cupt_path, pdb_path, sents, tokens)
+
+
+#################################################
+# BENCHMARKS
+#################################################
+
+
+class Result(NamedTuple):
+    command: str
+    sents: int
+    tokens: int
+    seconds: float
+    max_rss: int    # in KB
+
+
+def run_timed(argv: List[str], env: Dict[str, str]) -> Tuple[float, int]:
+    """Run the command, return its wall time and peak RSS (in KB)."""
+    start = time.time()
+    proc = subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL)
+    _pid, status, rusage = os.wait4(proc.pid, 0)
+    elapsed = time.time() - start
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise Exception(f"command failed: {' '.join(argv)}")
+    return elapsed, rusage.ru_maxrss
+
+
+def bench_commands(data: Dataset, out_dir: str, model: str) \
+        -> List[Tuple[str, List[str]]]:
+    """Determine the main.py commands to benchmark (in the order to run)."""
+    split_dir = os.path.join(out_dir, f"split-{data.sents}")
+    os.makedirs(split_dir, exist_ok=True)
+
+    def out(name):
+        return os.path.join(out_dir, f"{name}-{data.sents}.out")
+
+    conv = ["--upos", os.path.join(CONV_DIR, "upos_conv.txt"),
+            "--feats", os.path.join(CONV_DIR, "feat_conv.txt")]
+    return [
+        ("split", ["split", "-i", data.cupt_path, "--pdb", data.pdb_path,
+                   "-o", split_dir]),
+        ("align", ["align", "-s", data.pdb_path,
+                   "-d", os.path.join(split_dir, "PDB.cupt"),
+                   "-o", out("align")]),
+        ("tagset", ["tagset", "-i", data.cupt_path,
+                    "--upos", out("upos"), "--feats", out("feats")]),
+        ("convert", ["convert", "-i", data.cupt_path] + conv +
+         ["--qub", os.path.join(CONV_DIR, "qub_conv.txt"),
+          "--manual", os.path.join(CONV_DIR, "manual_conv.txt"),
+          "-o", out("convert")]),
+        ("words", ["words", "-i", data.cupt_path]),
+        ("num", ["num", "-i", data.cupt_path, "-o", out("num")]),
+        ("mwes", ["mwes", "-i", data.cupt_path, "-g", data.cupt_path]),
+        ("parse", ["parse", "-i", data.cupt_path, "-m", model,
+                   "-o", out("parse")]),
+    ]
+
+
+def bench_env(udpipe_model: Optional[str]) -> Tuple[Dict[str, str], str]:
+    """Determine the environment and the UDPipe model to run main.py with.
+
+    Without a model, the mock UDPipe module is used.
+    """
+    env = dict(os.environ)
+    if udpipe_model is not None:
+        return env, udpipe_model
+    env["PYTHONPATH"] = os.pathsep.join(
+        [MOCK_UDPIPE_DIR] + env.get("PYTHONPATH", "").split(os.pathsep))
+    return env, "mock"
+
+
+def run_benchmarks(args) -> List[Result]:
+    env, model = bench_env(args.udpipe_model)
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = []
+    for sents in args.sizes:
+        data = gen_dataset(args.work_dir, sents, seed=args.seed)
+        for name, cmd in bench_commands(data, args.work_dir, model):
+            if args.commands and name not in args.commands:
+                continue
+            argv = [sys.executable, MAIN_PY] + cmd
+            seconds, max_rss = run_timed(argv, env)
+            result = Result(name, data.sents, data.tokens, seconds, max_rss)
+            print_result(result)
+            results.append(result)
+    return results
+
+
+def print_result(res: Result):
+    speed = res.tokens / res.seconds if res.seconds > 0 else 0.0
+    print(f"{res.command:<8} {res.sents:>9} {res.tokens:>10} "
+          f"{res.seconds:>9.2f} {speed:>12.0f} {res.max_rss / 1024:>9.1f}",
+          flush=True)
+
+
+#################################################
+# MEMORY
+#################################################
+
+
+# Ways of keeping a corpus in memory: Python code run with `path` defined
+CORPUS_LOADERS = [
+    ("none", "import main"),
+    ("tokenlists", "import main; "
+     "data = {main.get_sent_id(sent): sent"
+     " for sent in main.collect_dataset([path])[1]}"),
+    ("corpus", "import main; "
+     "corpus = main.collect_corpus([path]); by_id = corpus.by_id()"),
+]
+
+
+def bench_memory(args):
+    """Compare the peak memory of the in-memory corpus representations."""
+    env, _model = bench_env(None)
+    os.makedirs(args.work_dir, exist_ok=True)
+    print(f"{'loader':<12} {'sents':>9} {'tokens':>10} {'file (MB)':>10}"
+          f" {'seconds':>9} {'RSS (MB)':>9}")
+    for sents in args.sizes:
+        data = gen_dataset(args.work_dir, sents, seed=args.seed)
+        size = os.path.getsize(data.cupt_path) / 2**20
+        for name, code in CORPUS_LOADERS:
+            code = f"import sys; sys.path.insert(0, {ROOT_DIR!r}); " \
+                f"path = {data.cupt_path!r}; " + code
+            seconds, max_rss = run_timed([sys.executable, "-c", code], env)
+            print(f"{name:<12} {data.sents:>9} {data.tokens:>10} "
+                  f"{size:>10.1f} {seconds:>9.2f} {max_rss / 1024:>9.1f}",
+                  flush=True)
+
+
+#################################################
+# STARTUP
+#################################################
+
+
+# Startup time budgets, relative to the startup of an interpreter which only
+# imports the modules used by every subcommand (`REFERENCE_START`): CPU time
+# of a main.py invocation on a tiny input (and with --help), as a multiple of
+# the reference CPU time, so that they do not depend on the speed of the host
+# (about 30% above the measured ratios, to absorb the measurement noise)
+REFERENCE_START = "import argparse, typing"
+STARTUP_BUDGETS = {
+    "--help": 3.9,
+    "words --help": 3.8,
+    "serve --help": 3.7,
+    "split": 4.1,
+    "align": 3.9,
+    "tagset": 3.8,
+    "convert": 4.3,
+    "words": 3.6,
+    "num": 3.9,
+    "mwes": 6.6,
+    "parse": 4.6,
+    "compile": 4.1,
+    "pipeline": 4.6,
+    "pack": 4.2,
+    "unpack": 3.8,
+    "validate": 3.7,
+    "stats": 3.9,
+    "shard": 4.0,
+    "merge": 3.8,
+    "build": 4.1,
+}
+
+# Modules which must not be imported by main.py at startup
+LAZY_MODULES = ["conllu", "parseme.cupt", "ufal.udpipe", "multiprocessing",
+                "sqlite3"]
+
+
+def cpu_time(argv: List[str], env: Dict[str, str]) -> float:
+    """Run the command, return its CPU time (in ms)."""
+    proc = subprocess.Popen(argv, env=env, stdout=subprocess.DEVNULL)
+    _pid, status, rusage = os.wait4(proc.pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise Exception(f"command failed: {' '.join(argv)}")
+    return 1000 * (rusage.ru_utime + rusage.ru_stime)
+
+
+def startup_ratio(argv: List[str], env: Dict[str, str], repeat: int) \
+        -> Tuple[float, float]:
+    """Measure the CPU time (in ms) of the command and its ratio to that of
+    the reference start, both the minimum of `repeat` runs.
+
+    The runs of the command and of the reference are interleaved, so that
+    changes in the load of the host affect both alike.
+    """
+    ref_argv = [sys.executable, "-c", REFERENCE_START]
+    times, ref_times = [], []
+    for _ in range(repeat):
+        ref_times.append(cpu_time(ref_argv, env))
+        times.append(cpu_time(argv, env))
+    return min(times), min(times) / min(ref_times)
+
+
+def eager_imports(env: Dict[str, str]) -> List[str]:
+    """Determine which of `LAZY_MODULES` are imported with main.py."""
+    code = "import sys, main; " \
+        f"print(' '.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], env=env, cwd=ROOT_DIR,
+                         check=True, capture_output=True, text=True)
+    return out.stdout.split()
+
+
+def main_subcommands() -> List[str]:
+    """Names of the subcommands of main.py (without their aliases)."""
+    import main
+    parser = main.mk_arg_parser()
+    subparsers, = (action for action in parser._actions
+                   if isinstance(action, argparse._SubParsersAction))
+    names: Dict[int, str] = dict()
+    for name, subparser in subparsers.choices.items():
+        names.setdefault(id(subparser), name)
+    return list(names.values())
+
+
+def startup_commands(data: Dataset, out_dir: str, model: str) \
+        -> List[Tuple[str, List[str]]]:
+    """Determine the main.py commands whose startup is measured: one per
+    subcommand, on a tiny input (see `bench_commands`), in the order to run.
+
+    `serve` does not exit, hence only its --help is measured.
+    """
+    def out(name):
+        return os.path.join(out_dir, f"{name}-{data.sents}.out")
+
+    conv = ["--upos", os.path.join(CONV_DIR, "upos_conv.txt"),
+            "--feats", os.path.join(CONV_DIR, "feat_conv.txt"),
+            "--qub", os.path.join(CONV_DIR, "qub_conv.txt"),
+            "--manual", os.path.join(CONV_DIR, "manual_conv.txt")]
+    pack_path = os.path.join(out_dir, f"synth-{data.sents}.pack")
+    shard_dir = os.path.join(out_dir, f"shards-{data.sents}")
+    build_path = os.path.join(out_dir, f"build-{data.sents}.txt")
+    with open(build_path, "w", encoding="utf-8") as build_file:
+        build_file.write(f"num -i {data.cupt_path} -o {out('build')}\n")
+    return [
+        ("--help", ["--help"]),
+        ("words --help", ["words", "--help"]),
+        ("serve --help", ["serve", "--help"]),
+    ] + bench_commands(data, out_dir, model) + [
+        ("compile", ["compile"] + conv + ["-o", out("table")]),
+        ("pipeline", ["pipeline", "-i", data.cupt_path, "--table",
+                      out("table"), "-m", model, "-o", out("pipeline")]),
+        ("pack", ["pack", "-i", data.cupt_path, "-o", pack_path]),
+        ("unpack", ["unpack", "-i", pack_path, "-o", out("unpack")]),
+        ("validate", ["validate", "-i", data.cupt_path]),
+        ("stats", ["stats", "-i", data.cupt_path, "-o", out("stats")]),
+        ("shard", ["shard", "-i", data.cupt_path, "-n", "2",
+                   "-o", shard_dir]),
+        ("merge", ["merge", "-i", os.path.join(shard_dir, "shard-000.cupt"),
+                   os.path.join(shard_dir, "shard-001.cupt"),
+                   "--index", os.path.join(shard_dir, "shards.tsv"),
+                   "-o", out("merge")]),
+        ("build", ["build", "-f", build_path]),
+    ]
+
+
+def startup_times(work_dir: str, udpipe_model: Optional[str], repeat: int) \
+        -> Dict[str, Tuple[float, float]]:
+    """Measure the startup commands of main.py (see `startup_commands`):
+    their CPU time (in ms) and its ratio to the reference start.
+    """
+    env, model = bench_env(udpipe_model)
+    os.makedirs(work_dir, exist_ok=True)
+    data = gen_dataset(work_dir, 10, seed=0)
+    return {
+        name: startup_ratio([sys.executable, MAIN_PY] + cmd, env, repeat)
+        for name, cmd in startup_commands(data, work_dir, model)
+    }
+
+
+def check_startup(args) -> bool:
+    """Measure the startup time of main.py subcommands, check the budgets
+    and the lazy imports.
+    """
+    times = startup_times(args.work_dir, args.udpipe_model, args.repeat)
+    print(f"{'command':<14} {'CPU (ms)':>9} {'ratio':>6} {'budget':>7}")
+    ok = True
+    for name, (spent, ratio) in times.items():
+        budget = STARTUP_BUDGETS.get(name)
+        over = budget is None or ratio > budget
+        ok = ok and not over
+        print(f"{name:<14} {spent:>9.1f} {ratio:>6.2f}"
+              f" {budget or '-':>7}{'  OVER BUDGET' if over else ''}",
+              flush=True)
+    eager = eager_imports(bench_env(args.udpipe_model)[0])
+    if eager:
+        print(f"imported at startup: {' '.join(eager)}")
+    return ok and not eager
+
+
+#################################################
+# SCHEDULING
+#################################################
+
+
+# Parse schedules: name and parse arguments (FIFO first, as the baseline)
+SCHEDULES = [
+    ("fifo", ["--schedule-window", "0"]),
+    ("length", []),
+]
+
+
+def bench_schedule(args):
+    """Compare the parse throughput of the schedules, check that they
+    produce the same output.
+    """
+    env, model = bench_env(args.udpipe_model)
+    env.setdefault("MOCK_UDPIPE_TOKEN_US", str(args.token_us))
+    os.makedirs(args.work_dir, exist_ok=True)
+    print(f"{'schedule':<8} {'sents':>9} {'tokens':>10} {'seconds':>9}"
+          f" {'tokens/sec':>12} {'gain':>7}")
+    for sents in args.sizes:
+        data = gen_dataset(args.work_dir, sents, seed=args.seed)
+        base, outputs = None, []
+        for name, opts in SCHEDULES:
+            out = os.path.join(args.work_dir, f"parse-{name}-{sents}.out")
+            argv = [sys.executable, MAIN_PY, "parse", "--local",
+                    "-i", data.cupt_path, "-m", model,
+                    "--workers", str(args.workers), "-o", out] + opts
+            seconds, _max_rss = run_timed(argv, env)
+            speed = data.tokens / seconds
+            base = base or speed
+            print(f"{name:<8} {data.sents:>9} {data.tokens:>10}"
+                  f" {seconds:>9.2f} {speed:>12.0f}"
+                  f" {100 * (speed / base - 1):>+6.1f}%", flush=True)
+            outputs.append(out)
+        if not all(filecmp.cmp(outputs[0], out, shallow=False)
+                   for out in outputs[1:]):
+            raise Exception(f"the schedules disagree: {' '.join(outputs)}")
+
+
+#################################################
+# ARGUMENTS
+#################################################
+
+
+def mk_arg_parser():
+    """Create the argument parser."""
+    parser = argparse.ArgumentParser(description='parseme-pl benchmarks')
+    subparsers = parser.add_subparsers(
+        dest='command', help='available commands')
+
+    parser_gen = subparsers.add_parser(
+        'gen', help='generate a synthetic .cupt corpus')
+    parser_gen.add_argument("-n",
+                            dest="sents",
+                            type=int,
+                            required=True,
+                            help="number of sentences",
+                            metavar="N")
+    parser_gen.add_argument("-o",
+                            dest="out_dir",
+                            required=True,
+                            help="output directory",
+                            metavar="DIR")
+    parser_gen.add_argument("--seed",
+                            dest="seed",
+                            type=int,
+                            default=0,
+                            help="random seed (default: 0)")
+
+    parser_run = subparsers.add_parser(
+        'run', help='benchmark main.py subcommands')
+    parser_run.add_argument("-d",
+                            dest="work_dir",
+                            required=True,
+                            help="directory for the data and outputs",
+                            metavar="DIR")
+    parser_run.add_argument("-n",
+                            dest="sizes",
+                            type=int,
+                            nargs='+',
+                            default=[10000, 100000, 1000000],
+                            help="dataset sizes, in sentences"
+                                 " (default: 10000 100000 1000000)",
+                            metavar="N")
+    parser_run.add_argument("-c",
+                            dest="commands",
+                            nargs='+',
+                            help="subcommands to benchmark (default: all)",
+                            metavar="CMD")
+    parser_run.add_argument("-m",
+                            dest="udpipe_model",
+                            help="UDPipe model (default: mock UDPipe)",
+                            metavar="FILE")
+    parser_run.add_argument("--seed",
+                            dest="seed",
+                            type=int,
+                            default=0,
+                            help="random seed (default: 0)")
+
+    parser_memory = subparsers.add_parser(
+        'memory', help='compare the peak memory of corpus representations')
+    parser_memory.add_argument("-d",
+                               dest="work_dir",
+                               required=True,
+                               help="directory for the data",
+                               metavar="DIR")
+    parser_memory.add_argument("-n",
+                               dest="sizes",
+                               type=int,
+                               nargs='+',
+                               default=[10000, 100000],
+                               help="dataset sizes, in sentences"
+                                    " (default: 10000 100000)",
+                               metavar="N")
+    parser_memory.add_argument("--seed",
+                               dest="seed",
+                               type=int,
+                               default=0,
+                               help="random seed (default: 0)")
+
+    parser_startup = subparsers.add_parser(
+        'startup', help='check the startup time budgets of main.py')
+    parser_startup.add_argument("-d",
+                                dest="work_dir",
+                                required=True,
+                                help="directory for the data and outputs",
+                                metavar="DIR")
+    parser_startup.add_argument("-r",
+                                dest="repeat",
+                                type=int,
+                                default=15,
+                                help="runs per command (default: 15)",
+                                metavar="N")
+    parser_startup.add_argument("-m",
+                                dest="udpipe_model",
+                                help="UDPipe model (default: mock UDPipe)",
+                                metavar="FILE")
+
+    parser_schedule = subparsers.add_parser(
+        'schedule', help='compare the FIFO and length-aware parse schedules')
+    parser_schedule.add_argument("-d",
+                                 dest="work_dir",
+                                 required=True,
+                                 help="directory for the data and outputs",
+                                 metavar="DIR")
+    parser_schedule.add_argument("-n",
+                                 dest="sizes",
+                                 type=int,
+                                 nargs='+',
+                                 default=[2000, 20000],
+                                 help="dataset sizes, in sentences"
+                                      " (default: 2000 20000)",
+                                 metavar="N")
+    parser_schedule.add_argument("-w",
+                                 dest="workers",
+                                 type=int,
+                                 default=4,
+                                 help="UDPipe worker processes (default: 4)",
+                                 metavar="N")
+    parser_schedule.add_argument("-m",
+                                 dest="udpipe_model",
+                                 help="UDPipe model (default: mock UDPipe)",
+                                 metavar="FILE")
+    parser_schedule.add_argument("--token-us",
+                                 dest="token_us",
+                                 type=float,
+                                 default=50.0,
+                                 help="per-token cost of the mock UDPipe,"
+                                      " in microseconds (default: 50)",
+                                 metavar="US")
+    parser_schedule.add_argument("--seed",
+                                 dest="seed",
+                                 type=int,
+                                 default=0,
+                                 help="random seed (default: 0)")
+
+    return parser
+
+
+#################################################
+# MAIN
+#################################################
+
+if __name__ == '__main__':
+    parser = mk_arg_parser()
+    args = parser.parse_args()
+    if args.command == 'gen':
+        os.makedirs(args.out_dir, exist_ok=True)
+        data = gen_dataset(args.out_dir, args.sents, seed=args.seed)
+        print(f"{data.cupt_path}: {data.sents} sentences, "
+              f"{data.tokens} tokens")
+        print(f"{data.pdb_path}: UD PDB counterpart")
+    if args.command == 'run':
+        print(f"{'command':<8} {'sents':>9} {'tokens':>10} "
+              f"{'seconds':>9} {'tokens/sec':>12} {'RSS (MB)':>9}")
+        run_benchmarks(args)
+    if args.command == 'memory':
+        bench_memory(args)
+    if args.command == 'schedule':
+        bench_schedule(args)
+    if args.command == 'startup':
+        if not check_startup(args):
+            sys.exit(1)
@@ -0,0 +1,83 @@
+"""Offline stand-in for `ufal.udpipe`, used to benchmark `main.py parse`.
+
+Implements the small part of the UDPipe API used in `main.py`.  The
+"parser" attaches each token to the previous one, the "tagger" replaces
+UPOS with X, and the "tokenizer" splits the text on whitespace.  An
+artificial per-token cost (in microseconds) can be set with the
+MOCK_UDPIPE_TOKEN_US environment variable.
+"""
+
+import os
+import time
+
+
+TOKEN_US = float(os.environ.get("MOCK_UDPIPE_TOKEN_US", "0"))
+
+
+class Model:
+
+    @staticmethod
+    def load(path):
+        return Model()
+
+
+class ProcessingError:
+
+    def __init__(self):
+        self.message = ""
+
+    def occurred(self):
+        return bool(self.message)
+
+
+class Pipeline:
+
+    DEFAULT = "default"
+    NONE = "none"
+
+    def __init__(self, model, input_format, tagger, parser, output_format):
+        self.tokenize = input_format == "tokenizer"
+        self.tag = tagger != Pipeline.NONE
+
+    def process(self, text, error):
+        if self.tokenize:
+            sents = [self._tokenize(line) for line in text.split("\n")
+                     if line.strip()]
+        else:
+            sents = self._read_conllu(text)
+        out = []
+        for comments, toks in sents:
+            out.extend(comments)
+            for i, tok in enumerate(toks):
+                if self.tag:
+                    tok[3] = "X"
+                tok[6] = str(i)
+                tok[7] = "root" if i == 0 else "dep"
+                out.append("\t".join(tok))
+            out.append("")
+            if TOKEN_US:
+                time.sleep(TOKEN_US * len(toks) / 1e6)
+        return "\n".join(out) + "\n" if out else ""
+
+    @staticmethod
+    def _tokenize(line):
+        toks = [
+            [str(i), form, "_", "_", "_", "_", "_", "_", "_", "_"]
+            for i, form in enumerate(line.split(), 1)
+        ]
+        return ["# text = " + line.strip()], toks
+
+    @staticmethod
+    def _read_conllu(text):
+        sents, comments, toks = [], [], []
+        for line in text.split("\n"):
+            if line.startswith("#"):
+                comments.append(line)
+            elif line.strip():
+                toks.append(line.split("\t")[:10])
+            elif comments or toks:
+                sents.append((comments, toks))
+                comments, toks = [], []
+        if comments or toks:
+            sents.append((comments, toks))
+        return sents
@@ -1,19 +1,27 @@
 #!/usr/bin/env python3
 
+from __future__ import annotations
+
 from typing import List, Dict, Optional, Tuple, Iterable, Set
 import typing
 import argparse
 import sys
+import functools
+import itertools
+import importlib
+import time
+import os
+import io
+import contextlib
 from collections import Counter
 # import tarfile
 
-import conllu
-from conllu import TokenList
-from conllu.parser import serialize_field
-
-import parseme.cupt as cupt
-
-from ufal.udpipe import Pipeline, ProcessingError, Model
+# Other modules, in particular `conllu`, `parseme.cupt` and `ufal.udpipe`,
+# are imported in the functions which need them, so that the startup of
+# the commands which do not is fast (see `bench/bench.py startup`).
+if typing.TYPE_CHECKING:
+    from conllu import TokenList
+    from ufal.udpipe import Pipeline, Model
 
 
 # TODO:
@@ -36,6 +44,9 @@ from ufal.udpipe import Pipeline, ProcessingError, Model
 # Global columns meta-data
 GlobalColumns = str
 
+# Generic type variable
+T = typing.TypeVar('T')
+
 
 #################################################
 # CONSTANTS
@@ -71,24 +82,228 @@ def get_sent_id(sent: TokenList) -> str:
     return sent.metadata["orig_file_sentence"].split('#')[0]
 
 
-def collect_dataset(paths: List[str]) \
+# Compression modules, by file extension
+COMPRESSORS = {".xz": "lzma", ".gz": "gzip", ".bz2": "bz2"}
+
+
+def open_data(path: str, mode: str = "r") -> typing.IO:
+    """Open the given (possibly compressed) data file.
+
+    The compression format is determined based on the file extension.
+    Files are opened in text mode (UTF-8) unless "b" is in `mode`.
+    """
+    module = COMPRESSORS.get(os.path.splitext(path)[1])
+    if module is not None:
+        module = importlib.import_module(module)
+    if "b" in mode:
+        return (module or io).open(path, mode)
+    if module is not None:
+        return module.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class BackgroundWriter:
+    """Text output file written (and compressed) in a background thread.
+
+    Text and sentences (see `write_sent`) are accumulated in chunks of (at
+    least) `chunk_size` characters or `chunk_sents` sentences, which are
+    then passed to the writing thread through a bounded queue.  Sentences
+    are serialized in the writing thread.  An error which occurs in the
+    writing thread is re-raised (once) on the next `write`, `flush` or
+    `close`.
+    """
+
+    def __init__(self, file: typing.TextIO, chunk_size=1 << 20,
+                 chunk_sents=1000, queue_size=16, close_file=True):
+        import queue
+        import threading
+        self.file = file
+        self.close_file = close_file
+        self.chunk_size = chunk_size
+        self.chunk_sents = chunk_sents
+        self.chunk, self.chunk_len = [], 0
+        self.error, self.error_raised = None, False
+        self.queue = queue.Queue(queue_size)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            chunk = self.queue.get()
+            try:
+                if chunk is None:
+                    return
+                if self.error is None:
+                    self.file.write(''.join(
+                        x if isinstance(x, str) else x.serialize()
+                        for x in chunk))
+            except BaseException as err:
+                self.error = err
+            finally:
+                self.queue.task_done()
+
+    def _check_error(self):
+        if self.error is not None and not self.error_raised:
+            self.error_raised = True
+            raise self.error
+
+    def _flush_chunk(self):
+        self._check_error()
+        if self.chunk:
+            self.queue.put(self.chunk)
+            self.chunk, self.chunk_len = [], 0
+
+    def write(self, text: str):
+        self.chunk.append(text)
+        self.chunk_len += len(text)
+        if self.chunk_len >= self.chunk_size:
+            self._flush_chunk()
+
+    def write_sent(self, sent):
+        """Write the sentence (TokenList or RawSentence), which must not be
+        modified afterwards.
+        """
+        self.chunk.append(sent)
+        if len(self.chunk) >= self.chunk_sents:
+            self._flush_chunk()
+
+    def flush(self):
+        """Wait until everything is written and flush the file."""
+        self._flush_chunk()
+        self.queue.join()
+        self._check_error()
+        self.file.flush()
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self):
+        try:
+            self._flush_chunk()
+        finally:
+            self.queue.put(None)
+            self.thread.join()
+            try:
+                if self.close_file:
+                    self.file.close()
+                else:
+                    self.file.flush()
+            except Exception:
+                # The file is broken, the writing thread failed already
+                if self.error is None:
+                    raise
+        self._check_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        # Do not hide the original error with those of the cleanup
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# Buffer size of the output files
+OUTPUT_BUFFER = 1 << 20
+# Whether the outputs are written in a background thread (--write-thread)
+WRITE_THREAD = False
+
+
+def open_output(path: Optional[str], mode: str = "w") \
+        -> typing.ContextManager[typing.TextIO]:
+    """Open the output file (stdout if `None`) in the given mode ("w" or
+    "a"), with a large buffer.
+
+    Compressed output files (see `COMPRESSORS`), and all the outputs if
+    `WRITE_THREAD` is set, are handled with `BackgroundWriter`, so that
+    serialization, compression and writing overlap with processing.
+    """
+    if path is None:
+        sys.stdout.flush()
+        try:
+            fd = sys.stdout.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            return contextlib.nullcontext(sys.stdout)
+        out = io.TextIOWrapper(
+            io.open(fd, "wb", buffering=OUTPUT_BUFFER, closefd=False),
+            encoding="utf-8")
+    elif os.path.splitext(path)[1] in COMPRESSORS:
+        return BackgroundWriter(open_data(path, mode))
+    else:
+        out = open(path, mode, encoding="utf-8", buffering=OUTPUT_BUFFER)
+    if WRITE_THREAD:
+        return BackgroundWriter(out)
+    return out
+
+
+def read_global_columns(path: str) -> Optional[GlobalColumns]:
+    """Read the global columns meta-data (if any) of the given file."""
+    if is_packed(path):
+        return PackedCorpus(path).cols
+    with open_data(path) as data_file:
+        header_line = data_file.readline().strip()
+        if header_line.startswith("# " + GLOBAL_COLUMNS_KEY + " ="):
+            assert "=" not in GLOBAL_COLUMNS_KEY
+            return header_line.split("=")[1].strip()
+        else:
+            return None
+
+
+def skip_sentences(data_file: typing.TextIO, n: int) -> int:
+    """Skip (at most) n sentences in the file, return the number skipped.
+
+    The sentences are not parsed, only their lines are read.
+    """
+    skipped, in_sent = 0, False
+    while skipped < n:
+        line = data_file.readline()
+        if not line:
+            break
+        if line.strip():
+            in_sent = True
+        elif in_sent:
+            skipped, in_sent = skipped + 1, False
+    return skipped + in_sent
+
+
+def collect_dataset(paths: List[str], skip: int = 0) \
         -> Tuple[GlobalColumns, Iterable[TokenList]]:
-    """Collect the dataset from the given .cupt files."""
+    """Collect the dataset from the given .cupt files.
+
+    The files can be compressed (see `open_data`).  The first `skip`
+    sentences are skipped without parsing them.
+    """
+    import conllu
 
     def get_columns():
         assert len(paths) > 0
-        with open(paths[0], "r", encoding="utf-8") as data_file:
-            header_line = data_file.readline().strip()
-            if header_line.startswith("# " + GLOBAL_COLUMNS_KEY + " ="):
-                assert "=" not in GLOBAL_COLUMNS_KEY
-                return header_line.split("=")[1].strip()
-            else:
-                return None
+        return read_global_columns(paths[0])
 
     def iterate():
+        to_skip = skip
+        PROFILER.set_inputs(paths)
         for path in paths:
-            with open(path, "r", encoding="utf-8") as data_file:
-                for sent in conllu.parse_incr(data_file):
+            if is_packed(path):
+                corpus = PackedCorpus(path)
+                first = min(to_skip, len(corpus))
+                to_skip -= first
+                sents = (corpus.sentence(i) for i in range(first, len(corpus)))
+                yield from PROFILER.read(None, sents)
+                continue
+            with open_data(path) as data_file:
+                fields = None
+                if to_skip > 0:
+                    # The global columns header is skipped as well
+                    cols = read_global_columns(path)
+                    fields = cols.lower().split() if cols else None
+                    to_skip -= skip_sentences(data_file, to_skip)
+                sents = conllu.parse_incr(data_file, fields=fields)
+                for sent in PROFILER.read(data_file, sents):
                     if GLOBAL_COLUMNS_KEY in sent.metadata:
                         del sent.metadata[GLOBAL_COLUMNS_KEY]
                     yield sent
@@ -100,6 +315,569 @@ def write_glob_cols(cols, file):
     file.write("# " + GLOBAL_COLUMNS_KEY + " = " + cols + "\n")
 
 
+def chunked(items: Iterable, size: int) -> Iterable[List]:
+    """Group the given items into lists of (at most) the given size."""
+    assert size > 0
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def map_files(fn: typing.Callable[[str], typing.Any], paths: List[str],
+              workers: int) -> Iterable:
+    """Apply the function to the given files, in (at most) `workers`
+    processes, and yield the results in the order of the files.
+    """
+    workers = min(workers, len(paths))
+    if workers > 1:
+        import multiprocessing
+        with multiprocessing.Pool(workers) as pool:
+            yield from pool.imap(fn, paths)
+    else:
+        yield from map(fn, paths)
+
+
+#################################################
+# PROFILING
+#################################################
+
+
+def current_rss() -> float:
+    """Current resident set size of the process, in MB."""
+    import resource
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") \
+                / 2**20
+    except (OSError, ValueError):
+        # Peak RSS, in KB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+
+class Profiler:
+    """Per-stage timing and progress reporting (the --profile option).
+
+    Stage times are counted separately in each thread (e.g., the reader
+    thread of parallel parsing), without locking.  When disabled, `stage`
+    and `read` add only a negligible overhead.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.every = 10.0
+        # Thread names with their stage times and calls
+        self.threads: List[Tuple[str, Counter, Counter]] = []
+        self.sents = 0
+        # Input sizes (in bytes) for ETA, None if unknown
+        self.total_bytes, self.done_bytes = None, 0
+
+    def enable(self, every: float):
+        """Enable profiling, report progress every given number of seconds."""
+        import threading
+        self.enabled = True
+        self.every = every
+        self.local = threading.local()
+        self.start = self.last_report = time.perf_counter()
+
+    def counters(self) -> Tuple[Counter, Counter]:
+        """Stage times and calls of the current thread."""
+        local = self.local
+        if not hasattr(local, "times"):
+            import threading
+            local.times, local.calls = Counter(), Counter()
+            self.threads.append((threading.current_thread().name,
+                                 local.times, local.calls))
+        return local.times, local.calls
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        """Measure the time spent in the given stage."""
+        if not self.enabled:
+            yield
+            return
+        times, calls = self.counters()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            times[name] += time.perf_counter() - start
+            calls[name] += 1
+
+    def set_inputs(self, paths: List[str]):
+        """Set the input files, used to estimate the remaining time."""
+        if any(os.path.splitext(p)[1] in COMPRESSORS or is_packed(p)
+               for p in paths):
+            self.total_bytes = None
+        else:
+            self.total_bytes = sum(os.path.getsize(p) for p in paths)
+        self.done_bytes = 0
+
+    def read(self, data_file: Optional[typing.TextIO], sents: Iterable[T]) \
+            -> Iterable[T]:
+        """Time reading the sentences from the given file, report progress.
+
+        `data_file` is None for packed corpora.
+        """
+        if not self.enabled:
+            yield from sents
+            return
+        sents = iter(sents)
+        times, calls = self.counters()
+        while True:
+            start = time.perf_counter()
+            try:
+                sent = next(sents)
+            except StopIteration:
+                break
+            finally:
+                times["read"] += time.perf_counter() - start
+                calls["read"] += 1
+            self.sents += 1
+            if time.perf_counter() - self.last_report >= self.every:
+                self.report_progress(data_file)
+            yield sent
+        if self.total_bytes is not None:
+            self.done_bytes += os.fstat(data_file.fileno()).st_size
+
+    def report_progress(self, data_file: typing.TextIO):
+        import datetime
+        now = self.last_report = time.perf_counter()
+        speed = self.sents / (now - self.start)
+        eta = "?"
+        if self.total_bytes:
+            done = self.done_bytes + data_file.buffer.tell()
+            if done > 0:
+                left = (now - self.start) * (self.total_bytes - done) / done
+                eta = str(datetime.timedelta(seconds=int(max(left, 0))))
+        print(f"# progress: {self.sents} sentences, {speed:.1f} sents/sec, "
+              f"ETA {eta}, RSS {current_rss():.0f} MB", file=sys.stderr)
+
+    def report(self):
+        """Print the per-stage time breakdown."""
+        import resource
+        wall = time.perf_counter() - self.start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+        print(f"# profile: {wall:.2f} sec, {self.sents} sentences, "
+              f"peak RSS {peak:.0f} MB", file=sys.stderr)
+        # Main thread first
+        threads = sorted((thread for thread in self.threads if thread[1]),
+                         key=lambda thread: thread[0] != "MainThread")
+        if len(threads) > 1:
+            print("# (the threads run in parallel: their stages overlap and"
+                  " may add up to more than the wall time)", file=sys.stderr)
+        indent = "  " if len(threads) > 1 else ""
+        for thread, times, calls in threads:
+            if indent:
+                name = "main" if thread == "MainThread" else thread
+                print(f"#   {name} thread:", file=sys.stderr)
+            for name, secs in times.most_common():
+                print(f"#   {indent}{name:<14} {secs:9.2f} sec"
+                      f" {100 * secs / wall:6.1f}% ({calls[name]} calls)",
+                      file=sys.stderr)
+
+
+# The global profiler
+PROFILER = Profiler()
+
+
+def write_sent(out: typing.TextIO, sent):
+    """Serialize and write the sentence (TokenList or RawSentence).
+
+    Sentences written to a `BackgroundWriter` are serialized in its
+    writing thread.
+    """
+    if isinstance(out, BackgroundWriter):
+        with PROFILER.stage("write"):
+            out.write_sent(sent)
+        return
+    with PROFILER.stage("serialize"):
+        text = sent.serialize()
+    with PROFILER.stage("write"):
+        out.write(text)
+
+
+#################################################
+# RAW SENTENCES
+#################################################
+
+
+# Columns of .conllu files without the global columns meta-data
+CONLLU_COLUMNS = "ID FORM LEMMA UPOS XPOS FEATS HEAD DEPREL DEPS MISC"
+
+
+class RawSentence:
+    """Sentence represented with raw lines, without full .conllu parsing.
+
+    Comment and token lines are kept verbatim (with newlines).  Token lines
+    are split into columns only on demand, so that untouched lines (and
+    comments) are written back byte-for-byte.
+    """
+
+    __slots__ = ("comments", "tokens")
+
+    def __init__(self, comments: List[str], tokens: List[str]):
+        self.comments = comments
+        self.tokens = tokens
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def get_columns(self, i: int) -> List[str]:
+        """Split the i-th token line into columns."""
+        return self.tokens[i].rstrip("\n").split("\t")
+
+    def set_columns(self, i: int, columns: List[str]):
+        """Replace the i-th token line with the given columns."""
+        self.tokens[i] = "\t".join(columns) + "\n"
+
+    def serialize(self) -> str:
+        return "".join(self.comments) + "".join(self.tokens) + "\n"
+
+    @property
+    def metadata(self) -> Dict[str, Optional[str]]:
+        """Metadata parsed from the comments (read-only, as in TokenList)."""
+        meta: Dict[str, Optional[str]] = dict()
+        for line in self.comments:
+            key, eq, value = line[1:].strip().partition("=")
+            meta[key.strip()] = value.strip() if eq else None
+        return meta
+
+
+def column_index(cols: Optional[GlobalColumns], name: str) -> int:
+    """Determine the position of the given column (e.g. `XPOS`)."""
+    return (cols or CONLLU_COLUMNS).lower().split().index(name)
+
+
+def read_raw_sentences(data_file: typing.TextIO) -> Iterable[RawSentence]:
+    """Read raw sentences from the given .conllu/.cupt file.
+
+    The global columns meta-data is skipped.
+    """
+    header = "# " + GLOBAL_COLUMNS_KEY + " ="
+    comments, tokens = [], []
+    for line in data_file:
+        if line.startswith("#"):
+            if not line.startswith(header):
+                comments.append(line)
+        elif line.strip():
+            tokens.append(line)
+        elif comments or tokens:
+            yield RawSentence(comments, tokens)
+            comments, tokens = [], []
+    if comments or tokens:
+        yield RawSentence(comments, tokens)
+
+
+def collect_raw_dataset(paths: List[str]) \
+        -> Tuple[GlobalColumns, Iterable[RawSentence]]:
+    """Collect the dataset from the given .cupt files as raw sentences.
+
+    A faster alternative to `collect_dataset` for commands which only
+    need to look at (or modify) a few columns.
+    """
+    assert len(paths) > 0
+
+    def iterate():
+        PROFILER.set_inputs(paths)
+        for path in paths:
+            if is_packed(path):
+                yield from PROFILER.read(None, PackedCorpus(path))
+                continue
+            with open_data(path) as data_file:
+                sents = read_raw_sentences(data_file)
+                yield from PROFILER.read(data_file, sents)
+
+    return read_global_columns(paths[0]), iterate()
+
+
+#################################################
+# CORPUS
+#################################################
+
+
+class Corpus:
+    """Columnar in-memory corpus.
+
+    Each column of each token is stored as an index in the vocabulary of
+    the column (strings are interned), in a per-column array.  Sentences
+    are represented by their token offsets and their (verbatim) comments.
+    Sentences can be retrieved as `RawSentence`s or `TokenList`s, which
+    serialize byte-for-byte as the input.
+    """
+
+    def __init__(self, cols: Optional[GlobalColumns], vocabs: List[List[str]],
+                 values: List[typing.Sequence[int]],
+                 starts: typing.Sequence[int], comments: typing.Sequence[str]):
+        self.cols = cols
+        self.vocabs = vocabs
+        self.values = values
+        self.starts = starts
+        self.comments = comments
+
+    @staticmethod
+    def from_raw(cols: Optional[GlobalColumns],
+                 sents: Iterable[RawSentence]) -> 'Corpus':
+        """Build the corpus from the given raw sentences."""
+        from array import array
+        ncols = len((cols or CONLLU_COLUMNS).split())
+        vocabs: List[List[str]] = [[] for _ in range(ncols)]
+        index: List[Dict[str, int]] = [dict() for _ in range(ncols)]
+        values = [array("I") for _ in range(ncols)]
+        starts, comments = array("Q", [0]), []
+        for sent in sents:
+            for i in range(len(sent)):
+                tok = sent.get_columns(i)
+                if len(tok) != ncols:
+                    raise Exception(f"{ncols} columns expected: {tok}")
+                for vocab, ix, vals, value in zip(vocabs, index, values, tok):
+                    k = ix.get(value)
+                    if k is None:
+                        k = ix[value] = len(vocab)
+                        vocab.append(value)
+                    vals.append(k)
+            starts.append(starts[-1] + len(sent))
+            comments.append("".join(sent.comments))
+        return Corpus(cols, vocabs, values, starts, comments)
+
+    def __len__(self) -> int:
+        return len(self.starts) - 1
+
+    def column(self, name: str) -> Tuple[List[str], typing.Sequence[int]]:
+        """The vocabulary and the token values of the given column."""
+        ix = column_index(self.cols, name)
+        return self.vocabs[ix], self.values[ix]
+
+    def raw(self, i: int) -> RawSentence:
+        """The i-th sentence (a copy)."""
+        comments = self.comments[i].splitlines(keepends=True)
+        tokens = [
+            "\t".join(vocab[vals[k]]
+                      for vocab, vals in zip(self.vocabs, self.values)) + "\n"
+            for k in range(self.starts[i], self.starts[i + 1])
+        ]
+        return RawSentence(comments, tokens)
+
+    def sentence(self, i: int) -> TokenList:
+        """The i-th sentence as a `TokenList` (a copy)."""
+        import conllu
+        fields = self.cols.lower().split() if self.cols else None
+        sent, = conllu.parse(self.raw(i).serialize(), fields=fields)
+        return sent
+
+    def __iter__(self) -> Iterable[RawSentence]:
+        return (self.raw(i) for i in range(len(self)))
+
+    def by_id(self) -> Dict[str, int]:
+        """Determine the map from sentence IDs (see `get_sent_id`) to
+        sentence indices.
+        """
+        res = dict()
+        for i in range(len(self)):
+            sid = get_sent_id(RawSentence(
+                self.comments[i].splitlines(keepends=True), []))
+            assert sid not in res
+            res[sid] = i
+        return res
+
+
+def collect_corpus(paths: List[str]) -> Corpus:
+    """Collect the dataset from the given .cupt files as a `Corpus`."""
+    return Corpus.from_raw(*collect_raw_dataset(paths))
+
+
+#################################################
+# PACKED CORPUS
+#################################################
+
+
+# Extension and magic number of the packed corpus files
+PACK_EXT = ".pack"
+PACK_MAGIC = b"PARSEME-PL-PACK\0"
+PACK_VERSION = 2
+# Empty slot of the sentence ID hash table
+NO_SENT = 2**32 - 1
+
+
+def is_packed(path: str) -> bool:
+    return path.endswith(PACK_EXT)
+
+
+class StringTable:
+    """Sequence of strings stored as offsets into a UTF-8 blob, decoded
+    on access (the blob can be memory-mapped).
+    """
+
+    def __init__(self, offsets: typing.Sequence[int], blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @staticmethod
+    def build(strings: Iterable[str]) -> 'StringTable':
+        from array import array
+        offsets, chunks = array("Q", [0]), []
+        for string in strings:
+            chunk = string.encode("utf-8")
+            chunks.append(chunk)
+            offsets.append(offsets[-1] + len(chunk))
+        return StringTable(offsets, b"".join(chunks))
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+    def __iter__(self) -> Iterable[str]:
+        return (self[i] for i in range(len(self)))
+
+
+def sent_id_hash(sid: str) -> int:
+    import zlib
+    return zlib.crc32(sid.encode("utf-8"))
+
+
+def pack_corpus(path: str, out_path: str):
+    """Pack the .cupt/.conllu file (see `PackedCorpus`).
+
+    An exception is raised if the file cannot be restored byte-for-byte
+    from the packed form, e.g., if it contains superfluous blank lines.
+    """
+    import hashlib
+    import json
+    from array import array
+
+    with open_data(path) as data_file:
+        header = data_file.readline()
+    if not header.startswith("# " + GLOBAL_COLUMNS_KEY + " ="):
+        header = ""
+    corpus = Corpus.from_raw(*collect_raw_dataset([path]))
+
+    # Check that the file can be restored
+    digest = hashlib.sha256(header.encode("utf-8"))
+    for sent in corpus:
+        digest.update(sent.serialize().encode("utf-8"))
+    orig_digest = hashlib.sha256()
+    with open_data(path, "rb") as data_file:
+        for block in iter(lambda: data_file.read(1 << 20), b""):
+            orig_digest.update(block)
+    if digest.digest() != orig_digest.digest():
+        raise Exception(f"{path} cannot be packed losslessly (irregular"
+                        f" blank lines or global columns?)")
+
+    # Sentence IDs and their (open addressing) hash table
+    ids = []
+    for comments in corpus.comments:
+        meta = RawSentence(comments.splitlines(keepends=True), []).metadata
+        sid = meta.get("orig_file_sentence")
+        ids.append(sid.split('#')[0] if sid else "")
+    size = 1
+    while size < 2 * len(ids):
+        size *= 2
+    table = array("I", [NO_SENT]) * size
+    for i, sid in enumerate(ids):
+        slot = sent_id_hash(sid) % size
+        while table[slot] != NO_SENT and ids[table[slot]] != sid:
+            slot = (slot + 1) % size
+        if sid and table[slot] == NO_SENT:
+            table[slot] = i
+
+    sections = {"starts": corpus.starts, "hash": table}
+    for name, strings in [("comments", corpus.comments), ("ids", ids)]:
+        tab = StringTable.build(strings)
+        sections[name + ".offsets"], sections[name + ".blob"] = \
+            tab.offsets, tab.blob
+    for k, (vocab, values) in enumerate(zip(corpus.vocabs, corpus.values)):
+        tab = StringTable.build(vocab)
+        sections[f"vocab{k}.offsets"], sections[f"vocab{k}.blob"] = \
+            tab.offsets, tab.blob
+        sections[f"values{k}"] = values
+
+    with open(out_path, "wb") as out:
+        out.write(PACK_MAGIC + bytes(16))
+        where = dict()
+        for name, data in sections.items():
+            out.write(bytes(-out.tell() % 8))   # 8-byte alignment
+            typecode = data.typecode if isinstance(data, array) else "B"
+            where[name] = (out.tell(), len(bytes(data)), typecode)
+            out.write(data)
+        directory = json.dumps({
+            "version": PACK_VERSION, "byteorder": sys.byteorder,
+            "cols": corpus.cols, "header": header, "sections": where,
+        }).encode("utf-8")
+        dir_offset = out.tell()
+        out.write(directory)
+        out.seek(len(PACK_MAGIC))
+        out.write(dir_offset.to_bytes(8, "little"))
+        out.write(len(directory).to_bytes(8, "little"))
+
+
+class PackedCorpus(Corpus):
+    """Memory-mapped packed corpus.
+
+    The file contains the `Corpus` arrays and vocabularies (see
+    `StringTable`), the sentence IDs (see `get_sent_id`) and their hash
+    table, which are read without copying from the memory-mapped file.
+    Their offsets, sizes and types are listed in a JSON directory at the
+    end of the file.
+    """
+
+    def __init__(self, path: str):
+        import json
+        import mmap
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self.mmap)
+        if bytes(data[:len(PACK_MAGIC)]) != PACK_MAGIC:
+            raise Exception(f"{path}: not a packed corpus")
+        dir_offset, dir_size = (
+            int.from_bytes(data[k:k + 8], "little")
+            for k in (len(PACK_MAGIC), len(PACK_MAGIC) + 8))
+        try:
+            directory = json.loads(
+                bytes(data[dir_offset:dir_offset + dir_size]))
+        except ValueError:
+            directory = {"version": None}
+        if directory["version"] != PACK_VERSION or \
+                directory["byteorder"] != sys.byteorder:
+            raise Exception(f"{path}: unsupported packed corpus version")
+        sections = {
+            name: data[offset:offset + size].cast(typecode)
+            for name, (offset, size, typecode)
+            in directory["sections"].items()
+        }
+
+        def table(name):
+            return StringTable(sections[name + ".offsets"],
+                               sections[name + ".blob"])
+        ncols = len((directory["cols"] or CONLLU_COLUMNS).split())
+        super().__init__(
+            directory["cols"],
+            [table(f"vocab{k}") for k in range(ncols)],
+            [sections[f"values{k}"] for k in range(ncols)],
+            sections["starts"], table("comments"))
+        self.header = directory["header"]
+        self.ids = table("ids")
+        self.hash = sections["hash"]
+
+    def find(self, sid: str) -> Optional[int]:
+        """Find the sentence with the given ID (see `get_sent_id`)."""
+        size = len(self.hash)
+        slot = sent_id_hash(sid) % size
+        while self.hash[slot] != NO_SENT:
+            if self.ids[self.hash[slot]] == sid:
+                return self.hash[slot]
+            slot = (slot + 1) % size
+        return None
+
+    def by_id(self) -> Dict[str, int]:
+        return {sid: i for i, sid in enumerate(self.ids) if sid}
+
+
 #################################################
 # SPLIT
 #################################################
@@ -147,19 +925,40 @@ def split_by_source(dataset: List[TokenList]) -> Dict[str, List[TokenList]]:
     return res
 
 
-def split_by_origin(dataset: Iterable[TokenList], pdb_ud_ids: Set[str]) \
-        -> Dict[str, List[TokenList]]:
-    """Split the given dataset based on source IDs."""
-    res = dict((orig, []) for orig in ORIG_IDS)
-    for sent in dataset:
-        sid = get_sent_id(sent)
-        if sid in pdb_ud_ids:
-            res[PDB].append(sent)
-        elif is_pcc(sid):
-            res[PCC].append(sent)
-        else:
-            res[NKJP].append(sent)
-    return res
+def sent_origin(sid: str, pdb_ud_ids: Set[str]) -> str:
+    """Determine the origin (one of ORIG_IDS) of the sentence with the ID."""
+    if sid in pdb_ud_ids:
+        return PDB
+    elif is_pcc(sid):
+        return PCC
+    else:
+        return NKJP
+
+
+def read_sent_ids(paths: List[str]) -> Set[str]:
+    """Collect the sentence IDs (see `get_sent_id`) in the given files.
+
+    Only the `orig_file_sentence` metadata lines are looked at, the
+    sentences themselves are not parsed.
+    """
+    ids = set()
+    for path in paths:
+        if is_packed(path):
+            for sid in PackedCorpus(path).ids:
+                if sid:
+                    assert sid not in ids
+                    ids.add(sid)
+            continue
+        with open_data(path) as data_file:
+            for line in data_file:
+                if not line.startswith("# orig_file_sentence"):
+                    continue
+                key, _, value = line[1:].partition("=")
+                if key.strip() == "orig_file_sentence":
+                    sid = value.strip().split('#')[0]
+                    assert sid not in ids
+                    ids.add(sid)
+    return ids
 
 
 #################################################
@@ -167,86 +966,597 @@ def split_by_origin(dataset: Iterable[TokenList], pdb_ud_ids: Set[str]) \
 #################################################
 
 
-def parse_raw_with_udpipe(model, text: str) -> List[TokenList]:
-    """Use UDPipe to parse the given raw text."""
-    pipeline = Pipeline(model, "tokenizer", Pipeline.DEFAULT,
-                        Pipeline.DEFAULT, "conllu")
-    error = ProcessingError()
-    processed = pipeline.process(text, error)
-    assert not error.occurred()
-    parsed = conllu.parse(processed)
-    # In metadata, keep only info about text
-    for sent in parsed:
-        meta = {'text': sent.metadata['text']}
-        sent.metadata = meta
-    return parsed
+def mk_pipeline(model, use_tagger=True) -> Pipeline:
+    """Create a UDPipe pipeline for parsing pre-tokenized .conllu input."""
+    from ufal.udpipe import Pipeline
+    tagger_opt = Pipeline.DEFAULT if use_tagger else Pipeline.NONE
+    return Pipeline(model, "conllu", tagger_opt, Pipeline.DEFAULT, "conllu")
 
 
-def parse_with_udpipe(model, sent: TokenList, use_tagger=True) -> TokenList:
-    """Use UDPipe to parse the given .conllu sentence."""
-    tagger_opt = Pipeline.DEFAULT if use_tagger else Pipeline.NONE
-    pipeline = Pipeline(model, "conllu", tagger_opt,
-                        Pipeline.DEFAULT, "conllu")
+def mk_raw_pipeline(model) -> Pipeline:
+    """Create a UDPipe pipeline for parsing raw text."""
+    from ufal.udpipe import Pipeline
+    return Pipeline(model, "tokenizer", Pipeline.DEFAULT,
+                    Pipeline.DEFAULT, "conllu")
+
+
+def run_pipeline(pipeline: Pipeline, text: str) -> str:
+    """Process the given text with UDPipe, check errors."""
+    from ufal.udpipe import ProcessingError
+    if not text:
+        return ""
     error = ProcessingError()
+    processed = pipeline.process(text, error)
+    if error.occurred():
+        print("ERROR: ", error.message, file=sys.stderr)
+        raise Exception(f"UDPipe error: {error.message}")
+    return processed
 
-    # Remove the MWE column if any
+
+def strip_mwes(sent: TokenList) -> List[str]:
+    """Remove the MWE column (if any) from the sentence, return its values."""
     mwes = []
     for tok in sent:
         if MWE_COL in tok:
             mwes.append(tok[MWE_COL])
             del tok[MWE_COL]
+    return mwes
 
-    # Perform parsing, check errors
-    processed = pipeline.process(sent.serialize(), error)
-    if error.occurred():
-        print("ERROR: ", error.message)
-    assert not error.occurred()
-    parsed = conllu.parse(processed)
-    assert len(parsed) == 1
-    parsed = parsed[0]
-
-    # Copy original metadata
-    parsed.metadata = sent.metadata
 
-    # Restore the MWE column
-    for tok, mwe in zip(parsed, mwes):
+def restore_mwes(sent: TokenList, mwes: List[str]):
+    """Restore the MWE column removed with `strip_mwes`."""
+    for tok, mwe in zip(sent, mwes):
         tok[MWE_COL] = mwe
 
+
+def udpipe_input(sent: TokenList, parse_raw=False) \
+        -> Tuple[str, Optional[List[str]]]:
+    """Determine the UDPipe input text for the given sentence.
+
+    In the raw mode, this is the text of the sentence.  Otherwise, the MWE
+    column is removed from the sentence and returned alongside its
+    serialization.  Metadata is not sent to UDPipe, it is restored from
+    the input sentence in `udpipe_output`.
+    """
+    from conllu import TokenList
+    if parse_raw:
+        return sent.metadata["text"], None
+    mwes = strip_mwes(sent)
+    return TokenList(sent, {}).serialize(), mwes
+
+
+def udpipe_output(sent: TokenList, mwes: Optional[List[str]],
+                  processed: str, parse_raw=False) -> List[TokenList]:
+    """Read the UDPipe output for the input prepared with `udpipe_input`."""
+    import conllu
+    parsed = conllu.parse(processed)
+    if parse_raw:
+        # In metadata, keep only info about text
+        for out in parsed:
+            meta = {'text': out.metadata['text']}
+            out.metadata = meta
+    else:
+        assert len(parsed) == 1
+        # Copy original metadata
+        parsed[0].metadata = sent.metadata
+        # Restore the MWE column
+        restore_mwes(parsed[0], mwes)
     return parsed
 
 
+def split_sentences(processed: str) -> List[str]:
+    """Split the .conllu UDPipe output into individual sentences."""
+    return [block + "\n\n" for block in processed.split("\n\n") if block]
+
+
+def _pipeline_worker(pipeline: Pipeline, tasks, results):
+    """Run UDPipe over the (index, text) tasks until the None sentinel."""
+    import traceback
+    for ix, text in iter(tasks.get, None):
+        try:
+            results.put((ix, run_pipeline(pipeline, text), None))
+        except BaseException:
+            results.put((ix, None, traceback.format_exc()))
+
+
+def run_pipeline_parallel(pipeline: Pipeline, jobs: Iterable[Tuple[T, str]],
+                          workers: int) \
+        -> Iterable[Tuple[T, typing.Union[str, Exception]]]:
+    """Run UDPipe over the texts in `jobs` in a pool of worker processes.
+
+    Each job is a (context, text) pair; contexts stay in the parent process
+    and are yielded together with the processed texts, in the input order.
+    For the texts UDPipe failed on, the exception is yielded instead (so
+    that the caller can still use the results of the preceding jobs).
+
+    Workers are forked and share the pipeline (and its model) with the
+    parent.  The jobs are read in a separate thread; at most `2 * workers`
+    jobs are in flight (read but not yielded yet), so that a slow job does
+    not make the contexts and the reorder buffer grow with the input.
+    """
+    import multiprocessing
+    import threading
+    import traceback
+    mp = multiprocessing.get_context("fork")
+    tasks = mp.Queue(2 * workers)
+    results = mp.Queue(2 * workers)
+    procs = [
+        mp.Process(target=_pipeline_worker,
+                   args=(pipeline, tasks, results),
+                   daemon=True)
+        for _ in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+
+    contexts = dict()
+    in_flight = threading.Semaphore(2 * workers)
+
+    def read():
+        n, err = 0, None
+        try:
+            for context, text in jobs:
+                in_flight.acquire()
+                contexts[n] = context
+                tasks.put((n, text))
+                n += 1
+        except BaseException:
+            err = traceback.format_exc()
+        for _ in procs:
+            tasks.put(None)
+        # End-of-input marker
+        results.put((None, n, err))
+
+    reader = threading.Thread(target=read, name="reader", daemon=True)
+    reader.start()
+
+    try:
+        buffer = dict()
+        next_ix, total, read_err = 0, None, None
+        while total is None or next_ix < total:
+            ix, processed, err = results.get()
+            if ix is None:
+                # Reading failed: first finish the jobs read so far
+                total, read_err = processed, err
+            elif err is not None:
+                buffer[ix] = Exception(f"parsing failed:\n{err}")
+            else:
+                buffer[ix] = processed
+            while next_ix in buffer:
+                yield contexts.pop(next_ix), buffer.pop(next_ix)
+                in_flight.release()
+                next_ix += 1
+        if read_err is not None:
+            raise Exception(f"reading failed:\n{read_err}")
+        for proc in procs:
+            proc.join()
+    finally:
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+
+
 #################################################
-# ALIGNMENT
+# PARSE SERVER
 #################################################
 
 
-def data_by_id(dataset: Iterable[TokenList]) -> Dict[str, TokenList]:
-    """Determine the map from sentence IDs to sentences."""
-    res = dict()
-    for sent in dataset:
-        sid = get_sent_id(sent)
-        assert sid not in res
-        res[sid] = sent
-    return res
+def default_socket_path() -> str:
+    """Default Unix socket of the `serve` server: in the (private) runtime
+    directory of the user if there is one, in the temporary directory
+    otherwise.
+    """
+    import tempfile
+    if os.environ.get("PARSEME_PL_SOCKET"):
+        return os.environ["PARSEME_PL_SOCKET"]
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return os.path.join(os.environ["XDG_RUNTIME_DIR"], "parseme-pl.sock")
+    return os.path.join(tempfile.gettempdir(),
+                        f"parseme-pl-{os.getuid()}.sock")
+
+
+def own_socket(path: str) -> bool:
+    """Check that the Unix socket is owned by the current user (and can
+    thus be trusted).
+    """
+    import stat
+    info = os.lstat(path)
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def model_info(path: str) -> Dict[str, typing.Any]:
+    """Identify the UDPipe model file (without reading it)."""
+    stat = os.stat(path)
+    return {"model": os.path.realpath(path), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns}
+
+
+def write_frame(f: typing.BinaryIO, data: bytes):
+    """Write a length-prefixed message to the (socket) file."""
+    f.write(len(data).to_bytes(8, "big"))
+    f.write(data)
+    f.flush()
+
+
+def read_frame(f: typing.BinaryIO) -> Optional[bytes]:
+    """Read a message written with `write_frame`, None at the end."""
+    size = f.read(8)
+    if not size:
+        return None
+    data = f.read(int.from_bytes(size, "big"))
+    if len(size) < 8 or len(data) < int.from_bytes(size, "big"):
+        raise Exception("connection to the parse server broken")
+    return data
+
+
+def serve_udpipe(model: Model, model_path: str, socket_path: str):
+    """Serve UDPipe parsing requests on the Unix socket (until killed).
+
+    Protocol: on connection, the server sends the `model_info` (JSON), the
+    client answers with the pipeline configuration (JSON, `raw` and
+    `tagger` flags).  Then, each .conllu (or raw text) message of the
+    client is processed with UDPipe and answered with `+` and the output,
+    or `-` and the (UDPipe) error message.  Each connection is handled in a
+    forked process, which shares the model with the server.
+    """
+    import json
+    import socket
+    import socketserver
+    from ufal.udpipe import ProcessingError
+
+    info = json.dumps(model_info(model_path)).encode("utf-8")
+
+    class Handler(socketserver.StreamRequestHandler):
+
+        def handle(self):
+            write_frame(self.wfile, info)
+            config = read_frame(self.rfile)
+            if config is None:
+                return
+            config = json.loads(config)
+            if config["raw"]:
+                pipeline = mk_raw_pipeline(model)
+            else:
+                pipeline = mk_pipeline(model, use_tagger=config["tagger"])
+            for text in iter(lambda: read_frame(self.rfile), None):
+                error = ProcessingError()
+                try:
+                    out = "+" + pipeline.process(text.decode("utf-8"), error)
+                    if error.occurred():
+                        out = "-" + error.message
+                except Exception as err:
+                    out = "-" + repr(err)
+                write_frame(self.wfile, out.encode("utf-8"))
+
+    class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        block_on_close = False
+
+    if os.path.lexists(socket_path):
+        if not own_socket(socket_path):
+            raise Exception(f"{socket_path} is not a socket of the current"
+                            f" user")
+        # Remove the socket left by a server which is no longer running
+        with socket.socket(socket.AF_UNIX) as sock:
+            if sock.connect_ex(socket_path) == 0:
+                raise Exception(f"a server is already running on"
+                                f" {socket_path}")
+        os.remove(socket_path)
+    # Only the current user may connect to the socket
+    umask = os.umask(0o177)
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(umask)
+    with server:
+        print(f"# serving {model_path} on {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
+
+class RemotePipeline:
+    """UDPipe pipeline run by the `serve` server, a drop-in replacement of
+    `Pipeline` for `run_pipeline`.
+
+    A separate connection is opened in each process (see
+    `run_pipeline_parallel`).
+    """
+
+    def __init__(self, socket_path: str, raw: bool, tagger: bool):
+        import json
+        self.socket_path = socket_path
+        self.config = json.dumps({"raw": raw, "tagger": tagger})
+        self.pid, self.info = None, None
+        self.connect()
+
+    def connect(self):
+        import json
+        import socket
+        self.sock = socket.socket(socket.AF_UNIX)
+        self.sock.connect(self.socket_path)
+        self.rfile = self.sock.makefile("rb")
+        self.wfile = self.sock.makefile("wb")
+        self.pid = os.getpid()
+        self.info = json.loads(read_frame(self.rfile))
+        write_frame(self.wfile, self.config.encode("utf-8"))
+
+    def process(self, text: str, error) -> str:
+        if self.pid != os.getpid():
+            self.connect()
+        write_frame(self.wfile, text.encode("utf-8"))
+        out = read_frame(self.rfile)
+        if out is None:
+            raise Exception("connection to the parse server closed")
+        out = out.decode("utf-8")
+        if out[0] == "-":
+            error.message = out[1:]
+            return ""
+        return out[1:]
+
+
+def connect_udpipe(socket_path: str, model_path: str, raw: bool,
+                   tagger: bool) -> Optional[RemotePipeline]:
+    """Connect to the server using the given model, None if not running
+    (or if the socket belongs to another user).
+    """
+    if not os.path.lexists(socket_path):
+        return None
+    if not own_socket(socket_path):
+        print(f"# {socket_path} is not a socket of the current user,"
+              f" parsing locally", file=sys.stderr)
+        return None
+    try:
+        pipeline = RemotePipeline(socket_path, raw=raw, tagger=tagger)
+    except (OSError, ValueError, TypeError):
+        return None
+    if pipeline.info != model_info(model_path):
+        print(f"# the server on {socket_path} uses another model"
+              f" ({pipeline.info['model']}), parsing locally",
+              file=sys.stderr)
+        return None
+    return pipeline
+
+
+#################################################
+# PARSE CACHE
+#################################################
+
+
+def file_digest(path: str) -> str:
+    """Compute the SHA-256 digest of the given file."""
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ParseCache:
+    """On-disk (SQLite) cache of UDPipe outputs with LRU eviction.
+
+    Keys are hashes of the UDPipe input text of a sentence (see
+    `udpipe_input`) salted with the model digest and the parsing options,
+    values are the corresponding UDPipe outputs.  Once the total size of
+    the values exceeds `max_size` bytes, the least recently used entries
+    are evicted.
+    """
+
+    # Number of updates between two commits
+    COMMIT_EVERY = 1000
+
+    def __init__(self, path: str, max_size: int, salt: str):
+        import sqlite3
+        import threading
+        self.salt = salt
+        self.max_size = max_size
+        self.hits, self.misses = 0, 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "size INTEGER NOT NULL, used INTEGER NOT NULL)")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS cache_used ON cache (used)")
+        size, clock = self.conn.execute(
+            "SELECT TOTAL(size), MAX(used) FROM cache").fetchone()
+        self.size = int(size)
+        self.clock = (clock or 0) + 1
+        self.updates = 0
+
+    def key(self, text: str) -> str:
+        """Determine the cache key of the given UDPipe input text."""
+        import hashlib
+        data = (self.salt + "\n" + text).encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Retrieve the value for the given key, if present."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute(
+                "UPDATE cache SET used = ? WHERE key = ?", (self.clock, key))
+            self.clock += 1
+            self._updated()
+            return row[0]
+
+    def put(self, key: str, value: str):
+        """Store the value for the given key."""
+        size = len(value.encode("utf-8"))
+        with self.lock:
+            old = self.conn.execute(
+                "SELECT size FROM cache WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.size -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (key, value, size, self.clock))
+            self.clock += 1
+            self.size += size
+            if self.size > self.max_size:
+                self._evict()
+            self._updated()
+
+    def _updated(self):
+        self.updates += 1
+        if self.updates % self.COMMIT_EVERY == 0:
+            self.conn.commit()
+
+    def _evict(self):
+        """Evict the least recently used entries (down to 90% of the cap)."""
+        excess = self.size - int(0.9 * self.max_size)
+        victims = []
+        rows = self.conn.execute(
+            "SELECT key, size FROM cache ORDER BY used").fetchall()
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+            self.size -= size
+        self.conn.executemany("DELETE FROM cache WHERE key = ?", victims)
+
+    def close(self):
+        """Commit the pending changes and report the stats on stderr."""
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
+        total = self.hits + self.misses
+        rate = 100.0 * self.hits / total if total else 0.0
+        print(f"# parse cache: {self.hits} hits, {self.misses} misses "
+              f"({rate:.1f}% hit rate), {self.size / 2**20:.1f} MB",
+              file=sys.stderr)
+
+
+#################################################
+# ALIGNMENT
+#################################################
 
 
-def align(source: Iterable[TokenList], dest: Iterable[TokenList]) \
-        -> List[Tuple[TokenList, Optional[TokenList]]]:
-    """For each sentence in `dest`, find the corresponding sentence
-    in `source`.
+def align_lookup(lookup: typing.Callable[[str], Optional[TokenList]],
+                 dest: Iterable[TokenList]) \
+        -> Iterable[Tuple[Optional[TokenList], TokenList]]:
+    """For each sentence in `dest`, find the corresponding source sentence
+    with the given lookup function (from sentence IDs).
     """
-    source_by_id = data_by_id(source)
-    res = []
     for dest_sent in dest:
         sid = get_sent_id(dest_sent)
-        source_sent = source_by_id.get(sid)
+        source_sent = lookup(sid)
         if source_sent and \
                 dest_sent.metadata['text'] != source_sent.metadata['text']:
             print("# text metadata differs:", file=sys.stderr)
             print("dst:", dest_sent.metadata['text'], file=sys.stderr)
             print("src:", source_sent.metadata['text'], file=sys.stderr)
-        res.append((source_sent, dest_sent))
-    return res
+        yield source_sent, dest_sent
+
+
+# Version of the sentence index format
+SENT_INDEX_VERSION = 2
+
+
+def build_sent_index(path: str) -> Dict[str, Tuple[int, int]]:
+    """Determine the byte offset and length of each sentence in the file,
+    by sentence ID (see `get_sent_id`).
+    """
+    index = dict()
+    offset, start, sid = 0, None, None
+
+    def add():
+        if sid is None:
+            raise Exception(f"{path}: no orig_file_sentence in the sentence"
+                            f" at byte {start}")
+        assert sid not in index
+        index[sid] = (start, offset - start)
+
+    with open(path, "rb") as data_file:
+        for line in data_file:
+            if line.strip():
+                if start is None:
+                    start = offset
+                if line.startswith(b"# orig_file_sentence"):
+                    key, _, value = line[1:].decode("utf-8").partition("=")
+                    if key.strip() == "orig_file_sentence":
+                        sid = value.strip().split('#')[0]
+            elif start is not None:
+                add()
+                start, sid = None, None
+            offset += len(line)
+    if start is not None:
+        add()
+    return index
+
+
+def load_sent_index(path: str) -> Dict[str, Tuple[int, int]]:
+    """Load the sentence index of the given file from `<path>.idx` (JSON).
+
+    The index is (re)built if missing or out of date w.r.t. the file.
+    """
+    import json
+    stat = os.stat(path)
+    stamp = [SENT_INDEX_VERSION, stat.st_size, stat.st_mtime_ns]
+    idx_path = path + ".idx"
+    try:
+        with open(idx_path, "rb") as idx_file:
+            idx_stamp, index = json.load(idx_file)
+        if idx_stamp == stamp:
+            return index
+    except (OSError, ValueError, TypeError):
+        pass
+    index = build_sent_index(path)
+    try:
+        with open(idx_path, "w", encoding="utf-8") as idx_file:
+            json.dump([stamp, index], idx_file, ensure_ascii=False)
+    except OSError as err:
+        print(f"WARNING: could not save {idx_path}: {err}", file=sys.stderr)
+    return index
+
+
+class SentIndex:
+    """Random access to the sentences of (uncompressed) .conllu/.cupt files,
+    by sentence ID.
+
+    Only the byte offsets of sentences are kept in memory (see
+    `load_sent_index`); sentences are parsed on demand from the
+    memory-mapped files.
+    """
+
+    def __init__(self, paths: List[str]):
+        import mmap
+        self.maps = []
+        self.where = dict()
+        for path in paths:
+            if os.path.getsize(path) == 0:
+                continue
+            with open(path, "rb") as data_file:
+                data = mmap.mmap(data_file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+            for sid, (offset, length) in load_sent_index(path).items():
+                assert sid not in self.where
+                self.where[sid] = (len(self.maps), offset, length)
+            self.maps.append(data)
+
+    def get(self, sid: str) -> Optional[TokenList]:
+        """Read the sentence with the given ID, if any."""
+        import conllu
+        if sid not in self.where:
+            return None
+        map_ix, offset, length = self.where[sid]
+        text = self.maps[map_ix][offset:offset+length].decode("utf-8")
+        sent, = conllu.parse(text)
+        if GLOBAL_COLUMNS_KEY in sent.metadata:
+            del sent.metadata[GLOBAL_COLUMNS_KEY]
+        return sent
+
+    def close(self):
+        for data in self.maps:
+            data.close()
 
 
 #################################################
@@ -265,29 +1575,87 @@ UPos = str
 Feats = str
 
 
-def tagset_mapping(dataset: List[TokenList]) \
-        -> Tuple[Dict[XPos, typing.Counter[UPos]],
-                 Dict[XPos, typing.Counter[Feats]]]:
-    """Determine the set of UPOS tags and feature dictionaries
-    for each XPOS in the given dataset.
+# XPOS -> UPOS and XPOS -> FEATS counts
+TagsetCounts = Tuple[Dict[XPos, typing.Counter[UPos]],
+                     Dict[XPos, typing.Counter[Feats]]]
+
+
+def count_tagset(path: str) -> TagsetCounts:
+    """Determine the set of UPOS tags and feature dictionaries (with their
+    counts) for each XPOS in the given file.
+
+    The file is read with the line-level reader (see `RawSentence`), or
+    directly from the columns of a packed corpus.  Multiword token ranges
+    and empty nodes are ignored.
     """
+    if is_packed(path):
+        return count_packed_tagset(PackedCorpus(path))
+    cols, dataset = collect_raw_dataset([path])
+    id_ix, xpos_ix = column_index(cols, "id"), column_index(cols, XPOS)
+    upos_ix, feats_ix = column_index(cols, UPOS), column_index(cols, FEATS)
     upos_map, feat_map = dict(), dict()
+    for sent in dataset:
+        for i in range(len(sent)):
+            tok = sent.get_columns(i)
+            if "-" in tok[id_ix] or "." in tok[id_ix]:
+                continue
+            xpos = tok[xpos_ix]
+            upos_map.setdefault(xpos, Counter())[tok[upos_ix]] += 1
+            feat_map.setdefault(xpos, Counter())[tok[feats_ix]] += 1
+    return upos_map, feat_map
 
-    def update_map(m, k, v):
-        if k not in m:
-            m[k] = Counter([v])
-        else:
-            m[k].update([v])
 
-    for sent in dataset:
-        for tok in sent:
-            # print(tok)
-            xpos = tok[XPOS]
-            upos = tok[UPOS]
-            feats = serialize_field(tok[FEATS])
-            update_map(upos_map, xpos, upos)
-            update_map(feat_map, xpos, feats)
+def count_packed_tagset(corpus: PackedCorpus) -> TagsetCounts:
+    """Determine the tagset counts in the packed corpus.
+
+    Pairs of vocabulary indices are counted, without decoding the tokens.
+    """
+    id_vocab, ids = corpus.column("id")
+    skip = {k for k, tok_id in enumerate(id_vocab)
+            if "-" in tok_id or "." in tok_id}
+    counts = []
+    for name in (UPOS, FEATS):
+        xpos_vocab, xpos = corpus.column(XPOS)
+        vocab, values = corpus.column(name)
+        pairs = Counter(zip(ids, xpos, values))
+        m = dict()
+        for (tok_id, x, v), n in pairs.items():
+            if tok_id not in skip:
+                m.setdefault(xpos_vocab[x], Counter())[vocab[v]] += n
+        counts.append(m)
+    return counts[0], counts[1]
+
+
+def merge_tagset_counts(counts: Iterable[TagsetCounts]) -> TagsetCounts:
+    """Merge the given (partial) tagset counts."""
+    upos_map, feat_map = dict(), dict()
+    for part_upos_map, part_feat_map in counts:
+        for m, part in ((upos_map, part_upos_map), (feat_map, part_feat_map)):
+            for xpos, counter in part.items():
+                m.setdefault(xpos, Counter()).update(counter)
+    return upos_map, feat_map
+
+
+def save_tagset_counts(counts: TagsetCounts, path: str):
+    """Save the tagset counts in the given (mergeable) counts file.
+
+    Each line has the form `upos|feats <TAB> XPOS <TAB> value <TAB> count`.
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        for kind, m in zip((UPOS, FEATS), counts):
+            for xpos, counter in m.items():
+                for value, n in counter.items():
+                    print(f"{kind}\t{xpos}\t{value}\t{n}", file=f)
 
+
+def load_tagset_counts(path: str) -> TagsetCounts:
+    """Load the tagset counts saved with `save_tagset_counts`."""
+    upos_map, feat_map = dict(), dict()
+    maps = {UPOS: upos_map, FEATS: feat_map}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            kind, xpos, value, n = line.rstrip("\n").split("\t")
+            maps[kind].setdefault(xpos, Counter())[value] += int(n)
     return upos_map, feat_map
 
 
@@ -338,14 +1706,198 @@ def load_manual_mapping(path: str) -> Dict[XPos, Tuple[UPos, Feats]]:
     return m
 
 
+#################################################
+# CONVERSION TABLE
+#################################################
+
+
+# Conversion result
+Conversion = Tuple[UPos, Feats]
+
+# XPOS of qub's, converted based on their lemmas
+QUB = "qub"
+
+# Conversion of qub's not in the qub map, and of unknown XPOS tags
+QUB_DEFAULT = ("PART", "_")
+XPOS_DEFAULT = ("TODO", "_")
+
+# Version of the binary conversion table format
+CONV_TABLE_VERSION = 1
+
+
+class ConvTable(typing.NamedTuple):
+    """XPOS -> (UPOS, FEATS) conversion table, already resolved by priority.
+
+    The upos/feats maps and the manual map (the latter takes priority) are
+    merged in `by_xpos`; the qub map is kept in `qub_by_lemma`.  All strings
+    are interned and the FEATS strings are ready to be written out.
+    """
+    by_xpos: Dict[XPos, Conversion]
+    qub_by_lemma: Dict[Lemma, Conversion]
+
+    def convert(self, xpos: XPos, lemma: Lemma) -> Conversion:
+        """Determine the UPOS and FEATS of the token."""
+        if xpos == QUB:
+            return self.qub_by_lemma.get(lemma, QUB_DEFAULT)
+        return self.by_xpos.get(xpos, XPOS_DEFAULT)
+
+
+def intern_conversions(m: Dict[str, Conversion]) -> Dict[str, Conversion]:
+    """Intern all strings in the given conversion map."""
+    return {
+        sys.intern(k): (sys.intern(upos), sys.intern(feats))
+        for k, (upos, feats) in m.items()
+    }
+
+
+def build_conv_table(upos_path: str, feat_path: str, qub_path: str,
+                     man_path: str) -> ConvTable:
+    """Merge the given conversion maps into a conversion table."""
+    upos_map = load_mapping(upos_path)
+    feat_map = load_mapping(feat_path)
+    by_xpos = {
+        key: (upos_map[key], feat_map[key])
+        for key in upos_map.keys()
+    }
+    by_xpos.update(load_manual_mapping(man_path))
+    return ConvTable(by_xpos=intern_conversions(by_xpos),
+                     qub_by_lemma=intern_conversions(
+                         load_qub_mapping(qub_path)))
+
+
+def save_conv_table(table: ConvTable, path: str):
+    """Save the conversion table in a binary file."""
+    import pickle
+    with open(path, "wb") as f:
+        data = (CONV_TABLE_VERSION, table.by_xpos, table.qub_by_lemma)
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_conv_table(path: str) -> ConvTable:
+    """Load the conversion table saved with `save_conv_table`."""
+    import pickle
+    with open(path, "rb") as f:
+        version, by_xpos, qub_by_lemma = pickle.load(f)
+    if version != CONV_TABLE_VERSION:
+        raise Exception(f"{path}: unsupported conversion table version "
+                        f"{version} (expected {CONV_TABLE_VERSION})")
+    return ConvTable(by_xpos=intern_conversions(by_xpos),
+                     qub_by_lemma=intern_conversions(qub_by_lemma))
+
+
 #################################################
 # ARGUMENTS
 #################################################
 
 
+def add_conv_map_args(parser, required: bool):
+    """Add the conversion map arguments to the given parser."""
+    parser.add_argument("--feats",
+                        dest="feat_path",
+                        required=required,
+                        help="feature conversion map",
+                        metavar="FILE")
+    parser.add_argument("--upos",
+                        dest="upos_path",
+                        required=required,
+                        help="upos conversion map",
+                        metavar="FILE")
+    parser.add_argument("--qub",
+                        dest="qub_path",
+                        required=required,
+                        help="qub conversion map",
+                        metavar="FILE")
+    parser.add_argument("--manual",
+                        dest="man_path",
+                        required=required,
+                        help="manual conversion map",
+                        metavar="FILE")
+
+
+def add_udpipe_args(parser):
+    """Add the UDPipe (parsing) arguments to the given parser."""
+    parser.add_argument("-m",
+                        dest="udpipe_model",
+                        required=True,
+                        help="input UDPipe model",
+                        metavar="FILE")
+    parser.add_argument("--disable-tagger",
+                        dest="disable_tagger",
+                        action="store_true",
+                        help="disable UDPipe tagger (only parsing)")
+    parser.add_argument("--batch-size",
+                        dest="batch_size",
+                        type=int,
+                        default=32,
+                        help="number of sentences sent to UDPipe at once"
+                             " (default: 32; ignored with --raw)",
+                        metavar="N")
+    parser.add_argument("--workers",
+                        dest="workers",
+                        type=int,
+                        default=1,
+                        help="number of UDPipe worker processes"
+                             " (default: 1)",
+                        metavar="N")
+    parser.add_argument("--schedule-window",
+                        dest="window",
+                        type=int,
+                        help="number of consecutive sentences batched by"
+                             " length and parsed longest first; 0 to parse"
+                             " in the input order (default: 1024 with"
+                             " --workers, 0 otherwise)",
+                        metavar="N")
+    parser.add_argument("--cache",
+                        dest="cache_path",
+                        help="on-disk cache of parsed sentences",
+                        metavar="FILE")
+    parser.add_argument("--cache-size",
+                        dest="cache_size",
+                        type=int,
+                        default=4096,
+                        help="cache size limit in MB (default: 4096)",
+                        metavar="MB")
+    add_socket_arg(parser)
+    parser.add_argument("--local",
+                        dest="local",
+                        action="store_true",
+                        help="load the model even if a server is running")
+
+
+def add_socket_arg(parser):
+    """Add the parse server socket argument to the given parser."""
+    parser.add_argument("--socket",
+                        dest="socket_path",
+                        help="Unix socket of the parse server (default:"
+                             " $PARSEME_PL_SOCKET, parseme-pl.sock in"
+                             " $XDG_RUNTIME_DIR or parseme-pl-UID.sock in"
+                             " the temporary directory)",
+                        metavar="PATH")
+
+
 def mk_arg_parser():
     """Create the argument parser."""
     parser = argparse.ArgumentParser(description='parseme-pl')
+    parser.add_argument("--profile",
+                        dest="profile",
+                        action="store_true",
+                        help="report progress and per-stage times on stderr")
+    parser.add_argument("--profile-every",
+                        dest="profile_every",
+                        type=float,
+                        default=10.0,
+                        help="progress report interval in seconds"
+                             " (default: 10)",
+                        metavar="SEC")
+    parser.add_argument("--cprofile",
+                        dest="cprofile_path",
+                        help="dump cProfile stats (pstats format) to the file",
+                        metavar="FILE")
+    parser.add_argument("--write-thread",
+                        dest="write_thread",
+                        action="store_true",
+                        help="serialize and write the output files in"
+                             " a background thread")
     subparsers = parser.add_subparsers(
         dest='command', help='available commands')
 
@@ -381,19 +1933,42 @@ def mk_arg_parser():
                               nargs='+',
                               help="input .conllu/.cupt files",
                               metavar="FILE")
-    parser_parse.add_argument("-m",
-                              dest="udpipe_model",
-                              required=True,
-                              help="input UDPipe model",
-                              metavar="FILE")
     parser_parse.add_argument("--raw",
                               dest="parse_raw",
                               action="store_true",
                               help="parse raw text (includes tokenization)")
-    parser_parse.add_argument("--disable-tagger",
-                              dest="disable_tagger",
+    add_udpipe_args(parser_parse)
+    parser_parse.add_argument("--checkpoint-every",
+                              dest="checkpoint_every",
+                              type=int,
+                              help="save a checkpoint (in FILE.ckpt, for -o"
+                                   " FILE) every N input sentences (default:"
+                                   " 1000 for uncompressed -o, 0 = never)",
+                              metavar="N")
+    parser_parse.add_argument("--resume",
+                              dest="resume",
+                              action="store_true",
+                              help="resume from the last checkpoint")
+    parser_parse.add_argument("--skip-errors",
+                              dest="skip_errors",
                               action="store_true",
-                              help="disable UDPipe tagger (only parsing)")
+                              help="report and skip the sentences UDPipe"
+                                   " fails on (default: abort)")
+    parser_parse.add_argument("-o",
+                              dest="out_path",
+                              help="output file (default: stdout);"
+                                   " .xz/.gz/.bz2 files are compressed",
+                              metavar="FILE")
+
+    parser_serve = subparsers.add_parser(
+        'serve', help='keep the UDPipe model loaded and serve parse'
+                      ' requests (see parse --socket)')
+    parser_serve.add_argument("-m",
+                              dest="udpipe_model",
+                              required=True,
+                              help="input UDPipe model",
+                              metavar="FILE")
+    add_socket_arg(parser_serve)
 
     parser_align = subparsers.add_parser(
         'align', help='align')
@@ -409,6 +1984,11 @@ def mk_arg_parser():
                               nargs='+',
                               help="dest .conllu/.cupt files",
                               metavar="FILE")
+    parser_align.add_argument("-o",
+                              dest="out_path",
+                              help="output file (default: stdout);"
+                                   " .xz/.gz/.bz2 files are compressed",
+                              metavar="FILE")
 
     # parser_conllu = subparsers.add_parser(
     #     'conllu', help='re-parse (with UDPipe) conllu raw .tar.gz')
@@ -427,19 +2007,34 @@ def mk_arg_parser():
         'tagset', help='determine XPOS -> UPOS/Feats tagset conversion')
     parser_tagset.add_argument("-i",
                                dest="paths",
-                               required=True,
+                               default=[],
                                nargs='+',
                                help="input .conllu/.cupt files",
                                metavar="FILE")
+    parser_tagset.add_argument("-c",
+                               dest="counts_paths",
+                               default=[],
+                               nargs='+',
+                               help="counts files to merge in",
+                               metavar="FILE")
+    parser_tagset.add_argument("--save-counts",
+                               dest="save_counts_path",
+                               help="save the merged counts in the file",
+                               metavar="FILE")
+    parser_tagset.add_argument("--workers",
+                               dest="workers",
+                               type=int,
+                               default=os.cpu_count(),
+                               help="number of input files counted in"
+                                    " parallel (default: number of CPUs)",
+                               metavar="N")
     parser_tagset.add_argument("--feats",
                                dest="feat_path",
-                               required=True,
-                               help="feature conversion map",
+                               help="output feature conversion map",
                                metavar="FILE")
     parser_tagset.add_argument("--upos",
                                dest="upos_path",
-                               required=True,
-                               help="upos conversion map",
+                               help="output upos conversion map",
                                metavar="FILE")
 
     parser_convert = subparsers.add_parser(
@@ -450,27 +2045,55 @@ def mk_arg_parser():
                                 nargs='+',
                                 help="input .conllu/.cupt files",
                                 metavar="FILE")
-    parser_convert.add_argument("--feats",
-                                dest="feat_path",
-                                required=True,
-                                help="feature conversion map",
+    add_conv_map_args(parser_convert, required=False)
+    parser_convert.add_argument("--table",
+                                dest="table_path",
+                                help="compiled conversion table (replaces"
+                                     " the conversion maps)",
                                 metavar="FILE")
-    parser_convert.add_argument("--upos",
-                                dest="upos_path",
-                                required=True,
-                                help="upos conversion map",
+    parser_convert.add_argument("-o",
+                                dest="out_path",
+                                help="output file (default: stdout);"
+                                     " .xz/.gz/.bz2 files are compressed",
                                 metavar="FILE")
-    parser_convert.add_argument("--qub",
-                                dest="qub_path",
-                                required=True,
-                                help="qub conversion map",
-                                metavar="FILE")
-    parser_convert.add_argument("--manual",
-                                dest="man_path",
+
+    parser_compile = subparsers.add_parser(
+        'compile', help='compile the conversion maps into a binary table')
+    add_conv_map_args(parser_compile, required=True)
+    parser_compile.add_argument("-o",
+                                dest="table_path",
                                 required=True,
-                                help="manual conversion map",
+                                help="output conversion table",
                                 metavar="FILE")
 
+    parser_pack = subparsers.add_parser(
+        'pack', aliases=['index'],
+        help='convert a .conllu/.cupt file to the (memory-mappable) packed'
+             ' format, with a sentence ID index')
+    parser_pack.add_argument("-i",
+                             dest="inp_path",
+                             required=True,
+                             help="input .conllu/.cupt file",
+                             metavar="FILE")
+    parser_pack.add_argument("-o",
+                             dest="out_path",
+                             required=True,
+                             help="output " + PACK_EXT + " file",
+                             metavar="FILE")
+
+    parser_unpack = subparsers.add_parser(
+        'unpack', help='convert a packed file back to .conllu/.cupt')
+    parser_unpack.add_argument("-i",
+                               dest="inp_path",
+                               required=True,
+                               help="input " + PACK_EXT + " file",
+                               metavar="FILE")
+    parser_unpack.add_argument("-o",
+                               dest="out_path",
+                               help="output file (default: stdout);"
+                                    " .xz/.gz/.bz2 files are compressed",
+                               metavar="FILE")
+
     parser_words = subparsers.add_parser(
         'words', help='calculate words in the given files')
     parser_words.add_argument("-i",
@@ -479,6 +2102,47 @@ def mk_arg_parser():
                               nargs='+',
                               help="input .conllu/.cupt files",
                               metavar="FILE")
+    parser_words.add_argument("--skip-ranges",
+                              dest="skip_ranges",
+                              action="store_true",
+                              help="do not count multiword token ranges"
+                                   " and empty nodes")
+    parser_words.add_argument("--workers",
+                              dest="workers",
+                              type=int,
+                              default=os.cpu_count(),
+                              help="number of files counted in parallel"
+                                   " (default: number of CPUs)",
+                              metavar="N")
+
+    parser_validate = subparsers.add_parser(
+        'validate', help='check the structural integrity of the given files')
+    parser_validate.add_argument("-i",
+                                 dest="paths",
+                                 required=True,
+                                 nargs='+',
+                                 help="input .conllu/.cupt files",
+                                 metavar="FILE")
+    parser_validate.add_argument("-k", "--max-errors",
+                                 dest="max_errors",
+                                 type=int,
+                                 default=10,
+                                 help="number of errors reported per file"
+                                      " (default: 10)",
+                                 metavar="K")
+    parser_validate.add_argument("--across",
+                                 dest="across",
+                                 action="store_true",
+                                 help="check that the sentence IDs are unique"
+                                      " across all the files (e.g., the"
+                                      " outputs of split)")
+    parser_validate.add_argument("--workers",
+                                 dest="workers",
+                                 type=int,
+                                 default=os.cpu_count(),
+                                 help="number of files checked in parallel"
+                                      " (default: number of CPUs)",
+                                 metavar="N")
 
     parser_words = subparsers.add_parser(
         'mwes', help='calculate MWE stats in the given files')
@@ -495,6 +2159,36 @@ def mk_arg_parser():
                               help="gold .cupt file(s)",
                               metavar="FILE")
 
+    parser_stats = subparsers.add_parser(
+        'stats', help='compute the statistics of the given files (JSON)')
+    parser_stats.add_argument("-i",
+                              dest="paths",
+                              required=True,
+                              nargs='+',
+                              help="input .conllu/.cupt files",
+                              metavar="FILE")
+    parser_stats.add_argument("--pdb",
+                              dest="pdb_paths",
+                              nargs='+',
+                              help="UD PDB .conllu files, to identify the"
+                                   " PDB sentences (origins)",
+                              metavar="FILE")
+    parser_stats.add_argument("--per-file",
+                              dest="per_file",
+                              action="store_true",
+                              help="also report the statistics of each file")
+    parser_stats.add_argument("--workers",
+                              dest="workers",
+                              type=int,
+                              default=os.cpu_count(),
+                              help="number of files processed in parallel"
+                                   " (default: number of CPUs)",
+                              metavar="N")
+    parser_stats.add_argument("-o",
+                              dest="out_path",
+                              help="output JSON file (default: stdout)",
+                              metavar="FILE")
+
     parser_num = subparsers.add_parser(
         'num', help='convert numerals')
     parser_num.add_argument("-i",
@@ -503,6 +2197,96 @@ def mk_arg_parser():
                             nargs='+',
                             help="input .conllu/.cupt files",
                             metavar="FILE")
+    parser_num.add_argument("-o",
+                            dest="out_path",
+                            help="output file (default: stdout);"
+                                 " .xz/.gz/.bz2 files are compressed",
+                            metavar="FILE")
+
+    parser_pipeline = subparsers.add_parser(
+        'pipeline', help='convert, parse (with UDPipe) and convert numerals'
+                         ' in a single pass')
+    parser_pipeline.add_argument("-i",
+                                 dest="paths",
+                                 required=True,
+                                 nargs='+',
+                                 help="input .conllu/.cupt files",
+                                 metavar="FILE")
+    add_conv_map_args(parser_pipeline, required=False)
+    parser_pipeline.add_argument("--table",
+                                 dest="table_path",
+                                 help="compiled conversion table (replaces"
+                                      " the conversion maps)",
+                                 metavar="FILE")
+    add_udpipe_args(parser_pipeline)
+    parser_pipeline.add_argument("--no-num",
+                                 dest="no_num",
+                                 action="store_true",
+                                 help="skip the numeral conversion step")
+    parser_pipeline.add_argument("-o",
+                                 dest="out_path",
+                                 help="output file (default: stdout);"
+                                      " .xz/.gz/.bz2 files are compressed",
+                                 metavar="FILE")
+
+    parser_shard = subparsers.add_parser(
+        'shard', help='split input files into shards balanced by tokens')
+    parser_shard.add_argument("-i",
+                              dest="paths",
+                              required=True,
+                              nargs='+',
+                              help="input .conllu/.cupt files",
+                              metavar="FILE")
+    parser_shard.add_argument("-n",
+                              dest="shard_num",
+                              type=int,
+                              required=True,
+                              help="number of shards",
+                              metavar="N")
+    parser_shard.add_argument("-o",
+                              dest="out_dir",
+                              required=True,
+                              help="output directory (shard-NNN.cupt files"
+                                   " and the " + SHARD_INDEX + " index)",
+                              metavar="DIR")
+
+    parser_merge = subparsers.add_parser(
+        'merge', help='merge (processed) shards in the original order')
+    parser_merge.add_argument("-i",
+                              dest="paths",
+                              required=True,
+                              nargs='+',
+                              help="shard files (in any order)",
+                              metavar="FILE")
+    parser_merge.add_argument("--index",
+                              dest="index_path",
+                              required=True,
+                              help="shard index (" + SHARD_INDEX + ")",
+                              metavar="FILE")
+    parser_merge.add_argument("-o",
+                              dest="out_path",
+                              help="output file (default: stdout);"
+                                   " .xz/.gz/.bz2 files are compressed",
+                              metavar="FILE")
+
+    parser_build = subparsers.add_parser(
+        'build', help='(re)build the targets whose dependencies changed')
+    parser_build.add_argument("-f",
+                              dest="build_path",
+                              required=True,
+                              help="build file (main.py commands, one per"
+                                   " line)",
+                              metavar="FILE")
+    parser_build.add_argument("--manifest",
+                              dest="manifest_path",
+                              help="build manifest (default: the build file"
+                                   " with the .manifest extension)",
+                              metavar="FILE")
+    parser_build.add_argument("-n", "--dry-run",
+                              dest="dry_run",
+                              action="store_true",
+                              help="only report which targets would be"
+                                   " rebuilt and why")
 
     return parser
 
@@ -521,43 +2305,50 @@ NKJP_uri = "http://clip.ipipan.waw.pl/NationalCorpusOfPolish?action=AttachFile&d
 # NKJP_path = "."
 
 
+def update_source_ids(sent: TokenList, src: str):
+    """Update the source ID information of the sentence from the origin."""
+    sid = get_sent_id(sent)
+    if src == PDB:
+        src_sid = ' '.join([PDB_uri, PDB_path, sid])
+    elif src == PCC:
+        file_id, *sid = sid.split("_")
+        sid = '_'.join(sid)
+        assert sid.startswith("morph")
+        path = "long/" + file_id + "/ann_morphosyntax.xml"
+        src_sid = ' '.join([PCC_uri, path, sid])
+    elif src == NKJP:
+        file_id, *sid = sid.split("_")
+        sid = '_'.join(sid)
+        assert sid.startswith("morph")
+        path = file_id + "/ann_morphosyntax.xml"
+        src_sid = ' '.join([NKJP_uri, path, sid])
+    else:
+        raise Exception("source unknown")
+    # Update both IDs
+    sent.metadata['orig_file_sentence'] = sid
+    sent.metadata['source_sent_id'] = src_sid
+    del sent.metadata['sent_id']
+
+
 def do_split(args):
     glob_cols, dataset = collect_dataset(args.inp_paths)
     assert glob_cols is not None
 
-    # datadict = split_by_source(dataset)
-    pdb_ids = data_by_id(collect_dataset(args.pdb_paths)[1]).keys()
-    datadict = split_by_origin(dataset, pdb_ud_ids=pdb_ids)
+    # Only the IDs of the PDB sentences are needed
+    pdb_ids = read_sent_ids(args.pdb_paths)
 
-    for (src, sents) in datadict.items():
-        out_path = args.out_dir + "/" + src + ".cupt"
-        with open(out_path, "w", encoding="utf-8") as data_file:
-            write_glob_cols(glob_cols, data_file)
-            for sent in sents:
-                # Update the source id information
-                sid = get_sent_id(sent)
-                if src == PDB:
-                    src_sid = ' '.join([PDB_uri, PDB_path, sid])
-                elif src == PCC:
-                    file_id, *sid = sid.split("_")
-                    sid = '_'.join(sid)
-                    assert sid.startswith("morph")
-                    path = "long/" + file_id + "/ann_morphosyntax.xml"
-                    src_sid = ' '.join([PCC_uri, path, sid])
-                elif src == NKJP:
-                    file_id, *sid = sid.split("_")
-                    sid = '_'.join(sid)
-                    assert sid.startswith("morph")
-                    path = file_id + "/ann_morphosyntax.xml"
-                    src_sid = ' '.join([NKJP_uri, path, sid])
-                else:
-                    raise Exception("source unknown")
-                # Update both IDs
-                sent.metadata['orig_file_sentence'] = sid
-                sent.metadata['source_sent_id'] = src_sid
-                del sent.metadata['sent_id']
-                # Serialize and print the updated sentence
-                data_file.write(sent.serialize())
+    # Stream the dataset, writing each sentence to the corresponding file
+    with contextlib.ExitStack() as stack:
+        out_files = dict()
+        for src in ORIG_IDS:
+            out_path = args.out_dir + "/" + src + ".cupt"
+            out_files[src] = stack.enter_context(open_output(out_path))
+            write_glob_cols(glob_cols, out_files[src])
+        for sent in dataset:
+            src = sent_origin(get_sent_id(sent), pdb_ids)
+            update_source_ids(sent, src)
+            # Serialize and print the updated sentence
+            write_sent(out_files[src], sent)
 
 
 #################################################
@@ -565,22 +2356,330 @@ def do_split(args):
 #################################################
 
 
+def sent_label(sent: TokenList) -> str:
+    """Identify the sentence in messages."""
+    meta = sent.metadata
+    return meta.get('source_sent_id') or meta.get('sent_id') \
+        or repr(meta.get('text'))
+
+
+def parse_dataset(pipeline: Pipeline, dataset: Iterable[TokenList],
+                  parse_raw=False, batch_size=1, workers=1, window=0,
+                  cache: Optional['ParseCache'] = None) \
+        -> Iterable[TokenList]:
+    """Parse the dataset with UDPipe, sentence batch by sentence batch.
+
+    With `workers > 1`, UDPipe is run in a pool of worker processes (see
+    `run_pipeline_parallel`); the output order is preserved.  With
+    `window > 0`, the batches are formed and handed out longest first
+    (see `schedule_batches`).  Sentences found in the `cache` are not sent
+    to UDPipe at all.
+    """
+    groups = parse_groups(pipeline, dataset, parse_raw=parse_raw,
+                          batch_size=batch_size, workers=workers,
+                          window=window, cache=cache)
+    return itertools.chain.from_iterable(groups)
+
+
+def schedule_batches(dataset: Iterable[TokenList], batch_size: int,
+                     window: int) \
+        -> Iterable[Tuple[List[int], List[TokenList]]]:
+    """Group the sentences into batches, yield them with the positions of
+    their sentences in the dataset.
+
+    With `window > 0`, each window of sentences is sorted by length and cut
+    into batches of about the same number of tokens, which are handed out
+    longest first, so that they do not delay the end; the first windows are
+    smaller, so that the workers start early.  Otherwise, the batches follow
+    the dataset order (FIFO).
+    """
+    n = 0
+    if window <= 0:
+        for batch in chunked(dataset, batch_size):
+            yield list(range(n, n + len(batch))), batch
+            n += len(batch)
+        return
+    dataset = iter(dataset)
+    window = max(window, batch_size)
+    size = batch_size
+    sents = list(itertools.islice(dataset, size))
+    while sents:
+        order = sorted(range(len(sents)), key=lambda i: -len(sents[i]))
+        nbatches = -(-len(sents) // batch_size)
+        total = sum(len(sent) + 1 for sent in sents)
+        batches, batch, done = [], [], 0
+        for i in order:
+            batch.append(i)
+            done += len(sents[i]) + 1
+            if done * nbatches >= total * (len(batches) + 1):
+                batches.append(batch)
+                batch = []
+        if batch:
+            batches.append(batch)
+        size = min(2 * size, window)
+        step = -(-size // len(batches))
+        following: List[TokenList] = []
+        for batch in batches:
+            yield [n + i for i in batch], [sents[i] for i in batch]
+            following.extend(itertools.islice(
+                dataset, min(step, size - len(following))))
+        n += len(sents)
+        sents = following
+
+
+def schedule_window(args) -> int:
+    """Determine the scheduling window (only useful with several workers)."""
+    if args.window is None:
+        return 1024 if args.workers > 1 else 0
+    return args.window
+
+
+def parse_groups(pipeline: Pipeline, dataset: Iterable[TokenList],
+                 parse_raw=False, batch_size=1, workers=1, window=0,
+                 cache: Optional['ParseCache'] = None, skip_errors=False) \
+        -> Iterable[List[TokenList]]:
+    """Parse the dataset, yield the list of output sentences of each input.
+
+    See `parse_dataset`.  With `skip_errors`, the sentences UDPipe fails on
+    are reported on stderr and their output lists are empty; a failing
+    batch is re-parsed sentence by sentence to find them.  Otherwise, the
+    error is raised once the sentences preceding the failed sentence are
+    yielded (which, with `window > 0`, may be parsed after it).  The results
+    of the batches scheduled out of order are kept in a reorder buffer until
+    they can be yielded in the dataset order; it holds at most one window
+    of sentences, as the batches of a window are all done before those of
+    the next one (see `schedule_batches`).
+    """
+    if parse_raw:
+        # Raw text is segmented by UDPipe, hence no batching
+        batch_size = 1
+
+    def prepare(positions, batch):
+        with PROFILER.stage("udpipe-input"):
+            inputs = [udpipe_input(sent, parse_raw) for sent in batch]
+        with PROFILER.stage("cache"):
+            keys = [cache.key(inp) if cache else None for inp, _ in inputs]
+            outputs = [cache.get(key) if cache else None for key in keys]
+        todo = ''.join(
+            inp for (inp, _), out in zip(inputs, outputs) if out is None)
+        return (positions, batch, inputs, keys, outputs), todo
+
+    def run(text):
+        with PROFILER.stage("udpipe"):
+            return run_pipeline(pipeline, text)
+
+    def try_run(text):
+        """Run UDPipe, return the exception if it fails."""
+        try:
+            return run(text)
+        except Exception as err:
+            return err
+
+    def finish(batch, inputs, keys, outputs, processed):
+        """Complete the outputs of the batch with the UDPipe output, return
+        the parsed sentences and the errors (by index in the batch).
+        """
+        misses = [i for i, out in enumerate(outputs) if out is None]
+        errors = dict()
+        if isinstance(processed, Exception):
+            # Failed batch: parse the sentences one by one
+            fresh = []
+            for i in misses:
+                try:
+                    fresh.append(run(inputs[i][0]))
+                except Exception as err:
+                    errors[i] = err
+                    fresh.append(None)
+            if not parse_raw:
+                fresh = [out and split_sentences(out)[0] for out in fresh]
+        elif parse_raw:
+            fresh = [processed] if misses else []
+        else:
+            fresh = split_sentences(processed)
+        assert len(fresh) == len(misses)
+        with PROFILER.stage("cache"):
+            for i, out in zip(misses, fresh):
+                outputs[i] = out
+                if cache and out is not None:
+                    cache.put(keys[i], out)
+        with PROFILER.stage("udpipe-output"):
+            parsed = [
+                udpipe_output(sent, mwes, out, parse_raw)
+                if out is not None else []
+                for sent, (_, mwes), out in zip(batch, inputs, outputs)
+            ]
+        return parsed, errors
+
+    jobs = (prepare(positions, batch) for positions, batch
+            in schedule_batches(dataset, batch_size, window))
+    if workers > 1:
+        done = run_pipeline_parallel(pipeline, jobs, workers)
+    else:
+        done = ((ctx, try_run(text)) for ctx, text in jobs)
+    # Reorder buffer: parsed sentences by position in the dataset
+    buffer: Dict[int, List[TokenList]] = dict()
+    next_pos = 0
+    # Position of the earliest failed sentence and the error
+    failed: Optional[Tuple[int, Exception]] = None
+    for (positions, batch, inputs, keys, outputs), processed in done:
+        parsed, errors = finish(batch, inputs, keys, outputs, processed)
+        for i, err in errors.items():
+            if skip_errors:
+                print(f"# skipped sentence {sent_label(batch[i])}:"
+                      f" parsing failed ({err})", file=sys.stderr)
+            elif failed is None or positions[i] < failed[0]:
+                failed = positions[i], err
+        buffer.update((pos, sents) for i, (pos, sents)
+                      in enumerate(zip(positions, parsed))
+                      if skip_errors or i not in errors)
+        while next_pos in buffer:
+            yield buffer.pop(next_pos)
+            next_pos += 1
+        if failed is not None and next_pos == failed[0]:
+            raise failed[1]
+    if failed is not None:
+        raise failed[1]
+    assert not buffer
+
+
+def load_udpipe(args, parse_raw=False) \
+        -> Tuple[Optional[Model], Pipeline, Optional['ParseCache']]:
+    """Create the UDPipe pipeline and cache specified in the arguments.
+
+    If a `serve` server with the same model is running, the pipeline is
+    a thin client of the server and no model is loaded.  Otherwise, the
+    model is loaded; the pipeline does not own it, hence it is returned
+    as well, to be kept alive as long as the pipeline is used.
+    """
+    use_tagger = not args.disable_tagger
+    model, pipeline = None, None
+    if not args.local:
+        socket_path = args.socket_path or default_socket_path()
+        pipeline = connect_udpipe(socket_path, args.udpipe_model,
+                                  raw=parse_raw, tagger=use_tagger)
+    if pipeline is None:
+        from ufal.udpipe import Model
+        model = Model.load(args.udpipe_model)
+        if parse_raw:
+            pipeline = mk_raw_pipeline(model)
+        else:
+            pipeline = mk_pipeline(model, use_tagger=use_tagger)
+    cache = None
+    if args.cache_path:
+        salt = f"{file_digest(args.udpipe_model)} " \
+            f"tagger={use_tagger} raw={parse_raw}"
+        cache = ParseCache(args.cache_path, args.cache_size * 2**20, salt)
+    return model, pipeline, cache
+
+
+def drop_orig_ids(sents: Iterable[TokenList]) -> Iterable[TokenList]:
+    """Remove the orig_file_sentence metadata from the parsed sentences."""
+    for sent in sents:
+        # We don't want to keep orig_file_sentence for NKJP or PCC
+        # (raw mode output has no such metadata in the first place)
+        sent.metadata.pop('orig_file_sentence', None)
+        yield sent
+
+
+class Checkpoint(typing.NamedTuple):
+    """Parsing progress: input sentences done, output file size (bytes)."""
+    paths: List[str]
+    sents: int
+    out_size: int
+
+
+def checkpoint_path(out_path: str) -> str:
+    return out_path + ".ckpt"
+
+
+def save_checkpoint(ckpt: Checkpoint, out_path: str):
+    import json
+    tmp_path = checkpoint_path(out_path) + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(ckpt._asdict(), f)
+    os.replace(tmp_path, checkpoint_path(out_path))
+
+
+def load_checkpoint(out_path: str) -> Checkpoint:
+    import json
+    with open(checkpoint_path(out_path), encoding="utf-8") as f:
+        return Checkpoint(**json.load(f))
+
+
+def checkpoint_every(args) -> int:
+    """Determine the checkpoint interval (0 if disabled).
+
+    Checkpoints are only possible for uncompressed, regular output files
+    (not, e.g., /dev/null or /dev/stdout).
+    """
+    import stat
+    possible = args.out_path is not None and \
+        os.path.splitext(args.out_path)[1] not in COMPRESSORS and \
+        (not os.path.exists(args.out_path) or
+         stat.S_ISREG(os.stat(args.out_path).st_mode))
+    if args.checkpoint_every is None:
+        return 1000 if possible else 0
+    if args.checkpoint_every > 0 and not possible:
+        raise Exception("checkpoints require an uncompressed, regular"
+                        " output file (-o)")
+    return args.checkpoint_every
+
+
 def do_parse(args):
-    cols, dataset = collect_dataset(args.paths)
+    every = checkpoint_every(args)
+    skip, out_size = 0, None
+    if args.resume:
+        if every == 0:
+            raise Exception("--resume requires checkpoints (and an"
+                            " uncompressed, regular output file -o)")
+        if os.path.exists(checkpoint_path(args.out_path)):
+            ckpt = load_checkpoint(args.out_path)
+            if ckpt.paths != args.paths:
+                raise Exception(f"the checkpoint is for {ckpt.paths}")
+            skip, out_size = ckpt.sents, ckpt.out_size
+            print(f"# resuming after {skip} sentences", file=sys.stderr)
+    cols, dataset = collect_dataset(args.paths, skip=skip)
+    model, pipeline, cache = load_udpipe(args, parse_raw=args.parse_raw)
+    parsed = parse_groups(pipeline, dataset, parse_raw=args.parse_raw,
+                          batch_size=args.batch_size, workers=args.workers,
+                          window=schedule_window(args), cache=cache,
+                          skip_errors=args.skip_errors)
+    if out_size is None:
+        output = open_output(args.out_path)
+    else:
+        # Drop the output written after the checkpoint
+        if os.path.getsize(args.out_path) < out_size:
+            raise Exception(f"{args.out_path} is shorter than checkpointed")
+        os.truncate(args.out_path, out_size)
+        output = open_output(args.out_path, "a")
+    try:
+        with output as out:
+            if cols and out_size is None:
+                write_glob_cols(cols, file=out)
+            for n, group in enumerate(parsed, start=skip + 1):
+                for sent in drop_orig_ids(group):
+                    write_sent(out, sent)
+                if every and n % every == 0:
+                    out.flush()
+                    os.fsync(out.fileno())
+                    size = os.fstat(out.fileno()).st_size
+                    save_checkpoint(Checkpoint(args.paths, n, size),
+                                    args.out_path)
+    finally:
+        if cache:
+            cache.close()
+    if every and os.path.exists(checkpoint_path(args.out_path)):
+        os.remove(checkpoint_path(args.out_path))
+
+
+def do_serve(args):
+    import signal
+    from ufal.udpipe import Model
     model = Model.load(args.udpipe_model)
-    if cols:
-        write_glob_cols(cols, file=sys.stdout)
-    for sent in dataset:
-        if args.parse_raw:
-            text = sent.metadata["text"]
-            parsed = parse_raw_with_udpipe(model, text)
-        else:
-            use_tagger = not args.disable_tagger
-            parsed = [parse_with_udpipe(model, sent, use_tagger=use_tagger)]
-        for sent in parsed:
-            # We don't want to keep orig_file_sentence for NKJP or PCC
-            del sent.metadata['orig_file_sentence']
-            print(sent.serialize(), end='')
+    # Clean up (remove the socket) when terminated
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    serve_udpipe(model, args.udpipe_model,
+                 args.socket_path or default_socket_path())
 
 
 #################################################
@@ -588,28 +2687,50 @@ def do_parse(args):
 #################################################
 
 
-def do_align(arcs):
-    src_cols, source_data = collect_dataset(args.source)
+def do_align(args):
     dst_cols, dest_data = collect_dataset(args.dest)
-    assert src_cols is None  # we print it on output
-    for src, dst in align(source_data, dest_data):
-        # print(dst.metadata['text'])
-        # print("=>", src is not None)
-        assert src is not None
-
-        # At this point we construct the metadata based
-        # on the metadata present in the true PDB (source)
-        sid = src.metadata['sent_id']
-        src_sid = ' '.join([PDB_uri, PDB_path, sid])
-        orig_sid = get_sent_id(src)
-        text = src.metadata['text']
-        src.metadata = {}
-        src.metadata['source_sent_id'] = src_sid
-        src.metadata['orig_file_sentence'] = orig_sid
-        src.metadata['text'] = text
-
-        # Print
-        print(src.serialize(), end='')
+    assert read_global_columns(args.source[0]) is None  # we print it on output
+    packed = [PackedCorpus(p) for p in args.source if is_packed(p)]
+    paths = [p for p in args.source if not is_packed(p)]
+    if any(os.path.splitext(p)[1] in COMPRESSORS for p in paths):
+        # Compressed files cannot be memory-mapped, they are kept in memory
+        source = SentIndex([])
+        corpus = collect_corpus(paths)
+        by_id = corpus.by_id()
+
+        def text_lookup(sid):
+            ix = by_id.get(sid)
+            return None if ix is None else corpus.sentence(ix)
+    else:
+        source = SentIndex(paths)
+        text_lookup = source.get
+
+    def lookup(sid):
+        for corpus in packed:
+            ix = corpus.find(sid)
+            if ix is not None:
+                return corpus.sentence(ix)
+        return text_lookup(sid)
+    with open_output(args.out_path) as out:
+        for src, dst in align_lookup(lookup, dest_data):
+            # print(dst.metadata['text'])
+            # print("=>", src is not None)
+            assert src is not None
+
+            # At this point we construct the metadata based
+            # on the metadata present in the true PDB (source)
+            sid = src.metadata['sent_id']
+            src_sid = ' '.join([PDB_uri, PDB_path, sid])
+            orig_sid = get_sent_id(src)
+            text = src.metadata['text']
+            src.metadata = {}
+            src.metadata['source_sent_id'] = src_sid
+            src.metadata['orig_file_sentence'] = orig_sid
+            src.metadata['text'] = text
+
+            # Print
+            write_sent(out, src)
+    source.close()
 
 
 #################################################
@@ -618,62 +2739,80 @@ def do_align(arcs):
 
 
 def do_tagset(args):
-    dataset = collect_dataset(args.paths)
-    upos_map, feat_map = tagset_mapping(dataset)
-    upos_map = most_common(upos_map)
-    feat_map = most_common(feat_map)
-    save_mapping(upos_map, args.upos_path)
-    save_mapping(feat_map, args.feat_path)
+    # Previously saved counts
+    counts = [load_tagset_counts(path) for path in args.counts_paths]
+    # Map: count the input files in parallel
+    counts += map_files(count_tagset, args.paths, args.workers)
+    # Reduce: merge all the counts
+    upos_map, feat_map = merge_tagset_counts(counts)
+    if args.save_counts_path:
+        save_tagset_counts((upos_map, feat_map), args.save_counts_path)
+    if args.upos_path:
+        save_mapping(most_common(upos_map), args.upos_path)
+    if args.feat_path:
+        save_mapping(most_common(feat_map), args.feat_path)
+
+
+def conv_table_from_args(args) -> ConvTable:
+    """Load or build the conversion table specified in the arguments."""
+    if args.table_path:
+        return load_conv_table(args.table_path)
+    map_paths = [args.upos_path, args.feat_path, args.qub_path, args.man_path]
+    if None in map_paths:
+        raise Exception("either --table or all of --upos, --feats, --qub"
+                        " and --manual must be specified")
+    return build_conv_table(*map_paths)
+
+
+def do_compile(args):
+    table = build_conv_table(args.upos_path, args.feat_path,
+                             args.qub_path, args.man_path)
+    save_conv_table(table, args.table_path)
+
+
+def convert_sents(table: ConvTable, cols: Optional[GlobalColumns],
+                  sents: Iterable[RawSentence]) -> Iterable[RawSentence]:
+    """Convert the UPOS and FEATS of the sentences w.r.t. the table."""
+    convert = table.convert
+    xpos_ix, lemma_ix = column_index(cols, XPOS), column_index(cols, LEMMA)
+    upos_ix, feats_ix = column_index(cols, UPOS), column_index(cols, FEATS)
+    for sent in sents:
+        with PROFILER.stage("convert"):
+            for i in range(len(sent)):
+                tok = sent.get_columns(i)
+                tok[upos_ix], tok[feats_ix] = \
+                    convert(tok[xpos_ix], tok[lemma_ix])
+                sent.set_columns(i, tok)
+        yield sent
 
 
 def do_convert(args):
-    # Load conversion maps
-    upos_map = load_mapping(args.upos_path)
-    feat_map = load_mapping(args.feat_path)
-    main_map = {
-        key: (upos_map[key], feat_map[key])
-        for key in upos_map.keys()
-    }
-    qub_map = load_qub_mapping(args.qub_path)
-    man_map = load_manual_mapping(args.man_path)
-
-    # # Conversion w.r.t to the given conversion map
-    # def convert(m, x, todo):
-    #     if x in m:
-    #         return m[x]
-    #     else:
-    #         return todo
-
-    # def convert_sent(conv, dest_col, sent, todo):
-    #     for tok in sent:
-    #         # print("A", tok, file=sys.stderr)
-    #         xpos = tok['xpostag']
-    #         tok[dest_col] = convert(conv, xpos, todo)
-    #         # print("B", tok, file=sys.stderr)
-
-    def convert_tok(tok):
-        xpos = tok[XPOS]
-        if xpos == 'qub':
-            default = "PART", "_"
-            upos, feats = qub_map.get(tok[LEMMA], default)
-        elif xpos in man_map:
-            upos, feats = man_map[xpos]
-        else:
-            default = "TODO", "_"
-            upos, feats = main_map.get(xpos, default)
-        tok[UPOS] = upos
-        tok[FEATS] = feats
+    table = conv_table_from_args(args)
 
     # Process dataset
-    cols, dataset = collect_dataset(args.paths)
-    if cols:
-        write_glob_cols(cols, file=sys.stdout)
-    for sent in dataset:
-        for tok in sent:
-            convert_tok(tok)
-        # convert_sent(upos_map, 'upostag', sent, "TODO")
-        # convert_sent(feat_map, 'feats', sent, "TODO=TODO")
-        print(sent.serialize(), end='')
+    cols, dataset = collect_raw_dataset(args.paths)
+    with open_output(args.out_path) as out:
+        if cols:
+            write_glob_cols(cols, file=out)
+        for sent in convert_sents(table, cols, dataset):
+            write_sent(out, sent)
+
+
+#################################################
+# PACK
+#################################################
+
+
+def do_pack(args):
+    pack_corpus(args.inp_path, args.out_path)
+
+
+def do_unpack(args):
+    corpus = PackedCorpus(args.inp_path)
+    with open_output(args.out_path) as out:
+        out.write(corpus.header)
+        for sent in corpus:
+            write_sent(out, sent)
 
 
 #################################################
@@ -681,12 +2820,235 @@ def do_convert(args):
 #################################################
 
 
+def count_words(path: str, skip_ranges=False) -> int:
+    """Count the token lines in the given (possibly compressed) file.
+
+    The file is scanned as raw bytes, without decoding and without
+    splitting it into sentences.  Multiword token ranges and empty nodes
+    are counted as well (as in `len(sent)`), unless `skip_ranges` is set.
+    """
+    if is_packed(path):
+        corpus = PackedCorpus(path)
+        if not skip_ranges:
+            return len(corpus.values[0])
+        vocab, ids = corpus.column("id")
+        counts = Counter(ids)
+        return sum(n for k, n in counts.items()
+                   if "-" not in vocab[k] and "." not in vocab[k])
+    n = 0
+    with open_data(path, "rb") as data_file:
+        for line in data_file:
+            if line[:1] == b"#" or line.isspace():
+                continue
+            if skip_ranges:
+                tok_id = line.split(b"\t", 1)[0]
+                if b"-" in tok_id or b"." in tok_id:
+                    continue
+            n += 1
+    return n
+
+
 def do_words(args):
-    N = 0
-    cols, dataset = collect_dataset(args.paths)
-    for sent in dataset:
-        N += len(sent)
-    print(N)
+    count = functools.partial(count_words, skip_ranges=args.skip_ranges)
+    counts = list(map_files(count, args.paths, args.workers))
+    if len(args.paths) == 1:
+        print(counts[0])
+    else:
+        for path, n in zip(args.paths, counts):
+            print(f"{n}\t{path}")
+        print(f"{sum(counts)}\ttotal")
+
+
+#################################################
+# VALIDATE
+#################################################
+
+
+# Metadata keys of the sentence IDs which must be unique
+SENT_ID_KEYS = ("orig_file_sentence", "source_sent_id", "sent_id")
+
+
+class Validation(typing.NamedTuple):
+    """Validation result of a file."""
+    path: str
+    # Total number of errors
+    nerrors: int
+    # The first errors: line numbers and messages
+    errors: List[Tuple[int, str]]
+    # First line of each sentence ID (see `SENT_ID_KEYS`), if kept
+    sent_ids: Dict[Tuple[str, str], int]
+
+
+def data_lines(path: str) -> Iterable[str]:
+    """Read the lines of the given (possibly compressed or packed) file."""
+    if is_packed(path):
+        corpus = PackedCorpus(path)
+        if corpus.header:
+            yield corpus.header
+        for sent in corpus:
+            yield from sent.serialize().splitlines(keepends=True)
+    else:
+        with open_data(path) as data_file:
+            yield from data_file
+
+
+def validate_file(path: str, max_errors: int = 10, keep_ids: bool = False) \
+        -> Validation:
+    """Check the structural integrity of the given .conllu/.cupt file.
+
+    The file is checked in a single pass over its lines, without parsing
+    the sentences: the number of columns (w.r.t. the global columns), the
+    token IDs, the HEADs, the MWE codes and the uniqueness of the sentence
+    IDs.  Only the first `max_errors` errors are kept, the sentence IDs
+    only if `keep_ids` is set.
+    """
+    nerrors, errors = 0, []
+    # Errors of the current sentence (HEADs are checked at its end)
+    pending: List[Tuple[int, str]] = []
+
+    def error(line_no: int, msg: str):
+        pending.append((line_no, msg))
+
+    def flush():
+        nonlocal nerrors
+        nerrors += len(pending)
+        errors.extend(sorted(pending, key=lambda e: e[0])
+                      [:max_errors - len(errors)])
+        pending.clear()
+
+    header = "# " + GLOBAL_COLUMNS_KEY + " ="
+    cols = CONLLU_COLUMNS.lower().split()
+    sent_ids: Dict[Tuple[str, str], int] = dict()
+    # Tokens of the current sentence: line numbers and fields
+    tokens: List[Tuple[int, List[str]]] = []
+    start, blank, line = None, False, "\n"
+
+    def check_sentence():
+        head_ix = cols.index("head") if "head" in cols else None
+        mwe_ix = cols.index(MWE_COL) if MWE_COL in cols else None
+        expected, mwes, heads = 1, set(), []
+        for line_no, tok in tokens:
+            tok_id = tok[0]
+            if tok_id.isdigit():
+                if int(tok_id) != expected:
+                    error(line_no, f"token ID {tok_id}, {expected} expected")
+                expected = int(tok_id) + 1
+            else:
+                first, dash, last = tok_id.partition("-")
+                word, dot, sub = tok_id.partition(".")
+                if dash and first.isdigit() and last.isdigit():
+                    if int(first) != expected or int(last) <= int(first):
+                        error(line_no, f"token range {tok_id}, {expected}-N"
+                                       f" expected")
+                elif dot and word.isdigit() and sub.isdigit():
+                    if int(word) != expected - 1:
+                        error(line_no, f"empty node {tok_id},"
+                                       f" {expected - 1}.N expected")
+                else:
+                    error(line_no, f"invalid token ID {tok_id!r}")
+            if len(tok) != len(cols):
+                error(line_no, f"{len(tok)} columns, {len(cols)} expected")
+                continue
+            if head_ix is not None and tok[head_ix] != "_" \
+                    and tok_id.isdigit():
+                heads.append((line_no, tok_id, tok[head_ix]))
+            if mwe_ix is not None and tok[mwe_ix] not in ("*", "_"):
+                for code in tok[mwe_ix].split(";"):
+                    mwe, colon, cat = code.partition(":")
+                    if not mwe.isdigit() or (colon and not cat):
+                        error(line_no, f"invalid MWE code {code!r}")
+                    elif colon and mwe in mwes:
+                        error(line_no, f"MWE {mwe} category given twice")
+                    elif not colon and mwe not in mwes:
+                        error(line_no, f"MWE {mwe} without category")
+                    mwes.add(mwe)
+        # HEADs refer to the words of the whole sentence
+        words = expected - 1
+        for line_no, tok_id, head in heads:
+            if not head.isdigit() or int(head) > words:
+                error(line_no, f"HEAD {head} out of range 0-{words}")
+            elif head == tok_id:
+                error(line_no, f"HEAD {head} of token {tok_id}")
+
+    for line_no, line in enumerate(data_lines(path), 1):
+        if line[0] == "#":
+            if line.startswith(header):
+                if line_no == 1:
+                    cols = line.partition("=")[2].lower().split()
+                else:
+                    error(line_no, "global columns not on the first line")
+                continue
+            if tokens:
+                error(line_no, "comment inside a sentence")
+            start = start or line_no
+            key, eq, value = line[1:].partition("=")
+            key = key.strip()
+            if eq and key in SENT_ID_KEYS:
+                sid = value.strip()
+                if key == "orig_file_sentence":
+                    sid = sid.split('#')[0]
+                first = sent_ids.setdefault((key, sid), line_no)
+                if first != line_no:
+                    error(line_no, f"duplicate {key} {sid}"
+                                   f" (first on line {first})")
+        elif not line.isspace():
+            start = start or line_no
+            tokens.append((line_no, line.rstrip("\n").split("\t")))
+        elif start is None:
+            if not blank:
+                error(line_no, "superfluous blank line")
+                flush()
+            blank = True
+        else:
+            if not tokens:
+                error(start, "sentence without tokens")
+            check_sentence()
+            flush()
+            tokens, start, blank = [], None, False
+    if start is not None:
+        error(start, "sentence not followed by a blank line")
+        check_sentence()
+    if not line.endswith("\n"):
+        error(line_no, "missing newline at the end of file")
+    flush()
+    return Validation(path, nerrors, errors, sent_ids if keep_ids else dict())
+
+
+def do_validate(args):
+    validate = functools.partial(validate_file, max_errors=args.max_errors,
+                                 keep_ids=args.across)
+    results = map_files(validate, args.paths, args.workers)
+    total = report_validation(results, args.max_errors)
+    if total:
+        print(f"{total} errors in total", file=sys.stderr)
+        sys.exit(1)
+
+
+def report_validation(results: Iterable[Validation], max_errors: int) -> int:
+    """Print the errors found in the files (in order), including the sentence
+    IDs duplicated across the files (if kept, see `validate_file`).
+    Return the total number of errors.
+    """
+    total = 0
+    sent_ids: Dict[Tuple[str, str], Tuple[str, int]] = dict()
+    for res in results:
+        for line_no, msg in res.errors:
+            print(f"{res.path}:{line_no}: {msg}")
+        if res.nerrors > len(res.errors):
+            print(f"{res.path}: {res.nerrors - len(res.errors)} more errors")
+        total += res.nerrors
+        dups = 0
+        for (key, sid), line_no in res.sent_ids.items():
+            first = sent_ids.setdefault((key, sid), (res.path, line_no))
+            if first[0] != res.path:
+                if dups < max_errors:
+                    print(f"{res.path}:{line_no}: duplicate {key} {sid}"
+                          f" (first on {first[0]}:{first[1]})")
+                dups += 1
+        if dups > max_errors:
+            print(f"{res.path}: {dups - max_errors} more duplicates")
+        total += dups
+    return total
 
 
 #################################################
@@ -701,30 +3063,231 @@ def is_digit_num(form: str) -> bool:
     return all(pred(x) for x in form)
 
 
+def num_form(form: str) -> str:
+    """Determine the NumForm feature value of the numeral."""
+    return NUM_DIGIT if is_digit_num(form) else NUM_WORD
+
+
 # def is_word_num(form: str) -> bool:
 #     """Is it a word-based number?  Approximation."""
 #     # return any(x.isalpha() for x in form)
 #     return not is_digit_num(form)
 
 
+def set_feat(feats: str, key: str, value: str) -> str:
+    """Set the value of the given feature in the serialized FEATS column.
+
+    A new feature is appended at the end, as with the `conllu` FEATS dict.
+    """
+    pairs = [] if feats == "_" else [f.split("=", 1) for f in feats.split("|")]
+    for pair in pairs:
+        if pair[0] == key:
+            pair[1] = value
+            break
+    else:
+        pairs.append([key, value])
+    return "|".join("=".join(pair) for pair in pairs)
+
+
+def set_num_forms(sents: Iterable[TokenList]) -> Iterable[TokenList]:
+    """Set the NumForm feature of the numerals in the parsed sentences."""
+    for sent in sents:
+        with PROFILER.stage("num"):
+            for tok in sent:
+                if tok[UPOS] == 'NUM':
+                    if tok[FEATS] is None:
+                        tok[FEATS] = {}
+                    tok[FEATS][NUM_FORM] = num_form(tok[FORM])
+        yield sent
+
+
 def do_nums(args):
-    cols, dataset = collect_dataset(args.paths)
+    cols, dataset = collect_raw_dataset(args.paths)
+    form_ix, upos_ix = column_index(cols, FORM), column_index(cols, UPOS)
+    feats_ix = column_index(cols, FEATS)
+    with open_output(args.out_path) as out:
+        for sent in dataset:
+            for i in range(len(sent)):
+                tok = sent.get_columns(i)
+                if tok[upos_ix] == 'NUM':
+                    tok[feats_ix] = set_feat(
+                        tok[feats_ix], NUM_FORM, num_form(tok[form_ix]))
+                    sent.set_columns(i, tok)
+            write_sent(out, sent)
+
+
+#################################################
+# PIPELINE
+#################################################
+
+
+def parse_raw_sents(cols: Optional[GlobalColumns],
+                    sents: Iterable[RawSentence]) -> Iterable[TokenList]:
+    """Parse the raw sentences into token lists (as `collect_dataset`)."""
+    import conllu
+    fields = cols.lower().split() if cols else None
+    for sent in sents:
+        with PROFILER.stage("conllu"):
+            parsed = conllu.parse(sent.serialize(), fields=fields)
+        assert len(parsed) == 1
+        yield parsed[0]
+
+
+def do_pipeline(args):
+    """Perform convert, parse and num in a single pass.
+
+    The output is the same as of the three commands run in a sequence,
+    except that the global columns header is written (as in `parse`).
+    """
+    table = conv_table_from_args(args)
+    cols, dataset = collect_raw_dataset(args.paths)
+    model, pipeline, cache = load_udpipe(args)
+    sents = convert_sents(table, cols, dataset)
+    sents = parse_dataset(pipeline, parse_raw_sents(cols, sents),
+                          batch_size=args.batch_size, workers=args.workers,
+                          window=schedule_window(args), cache=cache)
+    sents = drop_orig_ids(sents)
+    if not args.no_num:
+        sents = set_num_forms(sents)
+    try:
+        with open_output(args.out_path) as out:
+            if cols:
+                write_glob_cols(cols, file=out)
+            for sent in sents:
+                write_sent(out, sent)
+    finally:
+        if cache:
+            cache.close()
+
+
+#################################################
+# SHARDS
+#################################################
+
+
+SHARD_INDEX = "shards.tsv"
+
+
+def shard_path(out_dir: str, shard: int) -> str:
+    return f"{out_dir}/shard-{shard:03d}.cupt"
+
+
+def shard_sent_ids(sent) -> Tuple[str, str]:
+    """Sentence IDs used to check shards: `get_sent_id` and source ID.
+
+    The former is removed by `parse`, hence the latter.  Missing IDs are
+    represented with `_`.
+    """
+    meta = sent.metadata
+    orig_id = get_sent_id(sent) if "orig_file_sentence" in meta else "_"
+    return orig_id, meta.get("source_sent_id") or meta.get("sent_id") or "_"
+
+
+def do_shard(args):
+    assert args.shard_num > 0
+
+    # First pass: sentence lengths
+    _, dataset = collect_raw_dataset(args.paths)
+    lengths = [len(sent) for sent in dataset]
+    total = max(sum(lengths), 1)
+
+    # Second pass: write each sentence to its shard, so that shards are
+    # contiguous and balanced w.r.t. the number of tokens
+    cols, dataset = collect_raw_dataset(args.paths)
+    os.makedirs(args.out_dir, exist_ok=True)
+    with contextlib.ExitStack() as stack:
+        outs = []
+        for shard in range(args.shard_num):
+            out = stack.enter_context(
+                open_output(shard_path(args.out_dir, shard)))
+            if cols:
+                write_glob_cols(cols, file=out)
+            outs.append(out)
+        index = stack.enter_context(open(
+            args.out_dir + "/" + SHARD_INDEX, "w", encoding="utf-8"))
+        done = 0
+        for sent, length in zip(dataset, lengths):
+            # Shard of the middle token of the sentence
+            shard = min((2 * done + length) * args.shard_num // (2 * total),
+                        args.shard_num - 1)
+            done += length
+            write_sent(outs[shard], sent)
+            index.write("\t".join((str(shard), *shard_sent_ids(sent))) + "\n")
+
+
+def read_shard_index(path: str) -> List[Tuple[int, str, str]]:
+    """Read the shard index, i.e., (shard, orig ID, source ID) triples."""
+    with open(path, encoding="utf-8") as f:
+        return [(int(shard), orig_id, src_id) for shard, orig_id, src_id in
+                (line.rstrip("\n").split("\t") for line in f)]
+
+
+def shard_of(path: str, positions: Dict[Tuple[int, str], int],
+             index: List[Tuple[int, str, str]]) -> Optional[int]:
+    """Determine the shard of the (processed) shard file, None if empty."""
+    _, dataset = collect_raw_dataset([path])
     for sent in dataset:
-        for tok in sent:
-            if tok[UPOS] == 'NUM':
-                feats = tok[FEATS]
-                if is_digit_num(tok[FORM]):
-                    feats[NUM_FORM] = NUM_DIGIT
-                else:
-                    feats[NUM_FORM] = NUM_WORD
-                # # print(feats)
-                # if feats[NUM_FORM] == NUM_WORD:
-                #     if is_digit_num(tok[FORM]):
-                #         print(tok)
-                # else:
-                #     if is_word_num(tok[FORM]):
-                #         print(tok)
-        print(sent.serialize(), end='')
+        orig_id, src_id = shard_sent_ids(sent)
+        pos = positions.get((0, orig_id), positions.get((1, src_id)))
+        if pos is None:
+            raise Exception(f"unknown sentence {orig_id}/{src_id} in {path}")
+        return index[pos][0]
+    return None
+
+
+def do_merge(args):
+    index = read_shard_index(args.index_path)
+    # Positions of the sentences in the index, by (orig ID) or (source ID)
+    positions: Dict[Tuple[int, str], int] = dict()
+    for pos, (_, orig_id, src_id) in enumerate(index):
+        for key in [(0, orig_id), (1, src_id)]:
+            if key[1] != "_":
+                positions.setdefault(key, pos)
+
+    # Restore the original order of the shards
+    shards = dict()
+    for path in args.paths:
+        shard = shard_of(path, positions, index)
+        if shard is None:
+            continue  # empty shard
+        if shard in shards:
+            raise Exception(f"{path} and {shards[shard]} are the same shard")
+        shards[shard] = path
+    paths = [shards[shard] for shard in sorted(shards)]
+    if not paths:
+        raise Exception("merge: all shards are empty")
+
+    seen = [False] * len(index)
+    duplicated, unknown, misordered = [], [], 0
+    last = -1
+    cols, dataset = collect_raw_dataset(paths)
+    with open_output(args.out_path) as out:
+        if cols:
+            write_glob_cols(cols, file=out)
+        for sent in dataset:
+            orig_id, src_id = shard_sent_ids(sent)
+            pos = positions.get((0, orig_id), positions.get((1, src_id)))
+            if pos is None:
+                unknown.append(f"{orig_id}/{src_id}")
+            elif seen[pos]:
+                duplicated.append(f"{orig_id}/{src_id}")
+            else:
+                seen[pos] = True
+                misordered += pos < last
+                last = pos
+            write_sent(out, sent)
+
+    lost = [f"{orig_id}/{src_id}" for (_, orig_id, src_id), was in
+            zip(index, seen) if not was]
+    errors = []
+    for what, ids in [("lost", lost), ("duplicated", duplicated),
+                      ("unknown", unknown)]:
+        if ids:
+            errors.append(f"{len(ids)} {what} sentences (e.g. {ids[0]})")
+    if misordered:
+        errors.append(f"{misordered} sentences out of order")
+    if errors:
+        raise Exception("merge: " + "; ".join(errors))
 
 
 #################################################
@@ -732,22 +3295,79 @@ def do_nums(args):
 #################################################
 
 
-def stats_in(paths) -> Tuple[int, int]:
-    """Return the number of sentences in the given dataset collection."""
-    cols, dataset = collect_dataset(paths)
-    all_cats = Counter()
-    N = 0
-    for sent in dataset:
-        N += 1
-        mwes = cupt.retrieve_mwes(sent)
-        for mwe_id, mwe in mwes.items():
-            all_cats[mwe.cat] += 1
-    return N, sum(k for x, k in all_cats.items())
+# Per-sentence MWE statistics: sentence ID, text and MWE category counts
+SentMweStats = Tuple[Optional[str], Optional[str], typing.Counter[str]]
+
+
+def sent_mwe_stats(sent: TokenList) -> SentMweStats:
+    """Determine the MWE statistics of the given sentence."""
+    import parseme.cupt as cupt
+    cats = Counter(mwe.cat for mwe in cupt.retrieve_mwes(sent).values())
+    sid = sent.metadata.get('source_sent_id', sent.metadata.get('sent_id'))
+    return sid, sent.metadata.get('text'), cats
+
+
+def _mwe_stats_reader(paths: List[str], results):
+    """Send the per-sentence MWE statistics of the dataset in chunks."""
+    import traceback
+    try:
+        cols, dataset = collect_dataset(paths)
+        for chunk in chunked(map(sent_mwe_stats, dataset), 1000):
+            results.put((chunk, None))
+    except BaseException:
+        results.put((None, traceback.format_exc()))
+    results.put((None, None))
+
+
+def read_mwe_stats(paths: List[str]) -> Iterable[SentMweStats]:
+    """Read the per-sentence MWE statistics of the given dataset.
+
+    The dataset is read (and parsed) in a separate process, started
+    immediately, so that several datasets can be read concurrently.
+    """
+    import multiprocessing
+    mp = multiprocessing.get_context("fork")
+    results = mp.Queue(16)
+    proc = mp.Process(target=_mwe_stats_reader,
+                      args=(paths, results),
+                      daemon=True)
+    proc.start()
+
+    def iterate():
+        try:
+            for chunk, err in iter(results.get, (None, None)):
+                if err is not None:
+                    raise Exception(f"reading {paths} failed:\n{err}")
+                yield from chunk
+            proc.join()
+        finally:
+            if proc.is_alive():
+                proc.terminate()
+
+    return iterate()
 
 
 def do_mwe_stats(args):
-    pred_N, pred_M = stats_in(args.paths)
-    gold_N, gold_M = stats_in(args.gold_paths)
+    start = time.time()
+    pred_N, pred_cats = 0, Counter()
+    gold_N, gold_cats = 0, Counter()
+    mismatch = None
+
+    # Read both datasets concurrently and pair them sentence by sentence
+    pairs = itertools.zip_longest(read_mwe_stats(args.paths),
+                                  read_mwe_stats(args.gold_paths))
+    for pred, gold in pairs:
+        if pred is not None:
+            pred_N += 1
+            pred_cats.update(pred[2])
+        if gold is not None:
+            gold_N += 1
+            gold_cats.update(gold[2])
+        if mismatch is None and \
+                (pred is None or gold is None or pred[:2] != gold[:2]):
+            mismatch = (max(pred_N, gold_N), pred, gold)
+    elapsed = time.time() - start
+    pred_M, gold_M = sum(pred_cats.values()), sum(gold_cats.values())
 
     if gold_N == pred_N:
         print(f"Sentence number OK ({pred_N})")
@@ -757,27 +3377,506 @@ def do_mwe_stats(args):
     if (pred_M < 0.5 * gold_M) or (pred_M > 2 * gold_M):
         print(f"WARNING: Large number of MWE discrepancies ({pred_M} vs {gold_M} in gold)")
 
+    if mismatch is not None:
+        n, pred, gold = mismatch
+        pred_sid = pred[0] if pred else "<none>"
+        gold_sid = gold[0] if gold else "<none>"
+        print(f"First mismatching sentence (#{n}): {pred_sid} vs {gold_sid} in gold")
+
+    print("MWE category\tpred\tgold")
+    for cat in sorted(set(pred_cats) | set(gold_cats)):
+        print(f"{cat}\t{pred_cats[cat]}\t{gold_cats[cat]}")
+    print(f"Total\t{pred_M}\t{gold_M}")
+
+    speed = max(pred_N, gold_N) / elapsed if elapsed > 0 else 0.0
+    print(f"Throughput: {speed:.0f} sentences/sec", file=sys.stderr)
+
+
+#################################################
+# STATS
+#################################################
+
+
+# Origin of the sentences without the `orig_file_sentence` metadata
+UNKNOWN = "unknown"
+
+
+class CorpusStats:
+    """Dataset statistics, computed in a single pass over the sentences (see
+    `add`) and merged over the files of the dataset (see `merge`).
+
+    Tokens are syntactic words: multiword token ranges and empty nodes are
+    not counted.
+    """
+
+    def __init__(self):
+        # Sentences and tokens per origin (see `sent_origin`) and per source
+        # (see `text_source`)
+        self.sents: typing.Counter[str] = Counter()
+        self.tokens: typing.Counter[str] = Counter()
+        self.source_sents: typing.Counter[str] = Counter()
+        self.source_tokens: typing.Counter[str] = Counter()
+        # Tag histograms
+        self.xpos: typing.Counter[str] = Counter()
+        self.upos: typing.Counter[str] = Counter()
+        # MWEs per category
+        self.mwes: typing.Counter[str] = Counter()
+        # Sentence length (in tokens) distribution
+        self.lengths: typing.Counter[int] = Counter()
+
+    def add(self, sent: RawSentence, pdb_ids: Set[str], upos_ix: int,
+            xpos_ix: int, mwe_ix: Optional[int]):
+        """Add the sentence, given the positions of the UPOS, XPOS and MWE
+        (if any) columns.
+        """
+        sid = sent.metadata.get("orig_file_sentence")
+        if sid is None:
+            origin = source = UNKNOWN
+        else:
+            sid = sid.split('#')[0]
+            origin = sent_origin(sid, pdb_ids)
+            source = text_source(sid)
+        length = 0
+        for i in range(len(sent)):
+            tok = sent.get_columns(i)
+            if not tok[0].isdigit():
+                continue
+            length += 1
+            self.upos[tok[upos_ix]] += 1
+            self.xpos[tok[xpos_ix]] += 1
+            if mwe_ix is not None and tok[mwe_ix] not in ("*", "_"):
+                for code in tok[mwe_ix].split(";"):
+                    _, colon, cat = code.partition(":")
+                    if colon:
+                        self.mwes[cat] += 1
+        self.sents[origin] += 1
+        self.tokens[origin] += length
+        self.source_sents[source] += 1
+        self.source_tokens[source] += length
+        self.lengths[length] += 1
+
+    def merge(self, other: 'CorpusStats'):
+        for name, counts in vars(other).items():
+            getattr(self, name).update(counts)
+
+    def to_json(self) -> Dict[str, typing.Any]:
+        """Summarize the statistics as a JSON-serializable dict."""
+        def counts(sents, tokens):
+            return {key: {"sentences": sents[key], "tokens": tokens[key]}
+                    for key in sorted(sents)}
+
+        def histogram(counter):
+            return dict(counter.most_common())
+
+        def percentile(p):
+            # Smallest length such that p% of the sentences are not longer
+            rank, seen = p * nsents / 100, 0
+            for length in sorted(self.lengths):
+                seen += self.lengths[length]
+                if seen >= rank:
+                    return length
+            return 0
+
+        nsents, ntokens = sum(self.sents.values()), sum(self.tokens.values())
+        return {
+            "sentences": nsents,
+            "tokens": ntokens,
+            "origins": counts(self.sents, self.tokens),
+            "sources": counts(self.source_sents, self.source_tokens),
+            "upos": histogram(self.upos),
+            "xpos": histogram(self.xpos),
+            "mwes": {"total": sum(self.mwes.values()),
+                     "categories": histogram(self.mwes)},
+            "lengths": {
+                "min": min(self.lengths, default=0),
+                "max": max(self.lengths, default=0),
+                "mean": ntokens / nsents if nsents else 0.0,
+                "median": percentile(50),
+                "p90": percentile(90),
+                "p99": percentile(99),
+                "histogram": {str(length): self.lengths[length]
+                              for length in sorted(self.lengths)},
+            },
+        }
+
+
+def count_stats(path: str, pdb_ids: Set[str] = frozenset()) -> CorpusStats:
+    """Compute the statistics of the given (possibly compressed) file, read
+    with the line-level reader (see `RawSentence`), or directly from the
+    columns of a packed corpus.
+    """
+    if is_packed(path):
+        return count_packed_stats(PackedCorpus(path), pdb_ids)
+    stats = CorpusStats()
+    cols, dataset = collect_raw_dataset([path])
+    names = (cols or CONLLU_COLUMNS).lower().split()
+    mwe_ix = names.index(MWE_COL) if MWE_COL in names else None
+    for sent in dataset:
+        stats.add(sent, pdb_ids, names.index(UPOS), names.index(XPOS), mwe_ix)
+    return stats
+
+
+def count_packed_stats(corpus: PackedCorpus, pdb_ids: Set[str]) \
+        -> CorpusStats:
+    """Compute the statistics of the packed corpus (see `count_stats`).
+
+    Tags and MWE codes are counted as vocabulary indices, without decoding
+    the tokens.
+    """
+    stats = CorpusStats()
+    id_vocab, ids = corpus.column("id")
+    is_word = [tok_id.isdigit() for tok_id in id_vocab]
+    for i, sid in enumerate(corpus.ids):
+        start, end = corpus.starts[i], corpus.starts[i + 1]
+        length = sum(is_word[k] for k in ids[start:end])
+        origin = sent_origin(sid, pdb_ids) if sid else UNKNOWN
+        source = text_source(sid) if sid else UNKNOWN
+        stats.sents[origin] += 1
+        stats.tokens[origin] += length
+        stats.source_sents[source] += 1
+        stats.source_tokens[source] += length
+        stats.lengths[length] += 1
+    for name, counter in [(UPOS, stats.upos), (XPOS, stats.xpos)]:
+        vocab, values = corpus.column(name)
+        for (k, v), n in Counter(zip(ids, values)).items():
+            if is_word[k]:
+                counter[vocab[v]] += n
+    if MWE_COL in (corpus.cols or CONLLU_COLUMNS).lower().split():
+        vocab, values = corpus.column(MWE_COL)
+        for (k, v), n in Counter(zip(ids, values)).items():
+            if is_word[k] and vocab[v] not in ("*", "_"):
+                for code in vocab[v].split(";"):
+                    _, colon, cat = code.partition(":")
+                    if colon:
+                        stats.mwes[cat] += n
+    return stats
+
+
+def do_stats(args):
+    import json
+    pdb_ids = read_sent_ids(args.pdb_paths) if args.pdb_paths else set()
+    count = functools.partial(count_stats, pdb_ids=pdb_ids)
+    # Map: compute the statistics of the input files in parallel
+    parts = list(map_files(count, args.paths, args.workers))
+    # Reduce: merge the statistics
+    stats = CorpusStats()
+    for part in parts:
+        stats.merge(part)
+    res = {"files": args.paths}
+    res.update(stats.to_json())
+    if args.per_file:
+        res["per_file"] = {path: part.to_json()
+                           for path, part in zip(args.paths, parts)}
+    with open_output(args.out_path) as out:
+        json.dump(res, out, indent=2, ensure_ascii=False)
+        out.write("\n")
+
+
+#################################################
+# BUILD
+#################################################
+
+
+# Input and output file arguments of the commands (argparse `dest`s)
+INPUT_ARGS = {
+    'split': ['inp_paths', 'pdb_paths'],
+    'parse': ['paths', 'udpipe_model'],
+    'align': ['source', 'dest'],
+    'tagset': ['paths', 'counts_paths'],
+    'convert': ['paths', 'feat_path', 'upos_path', 'qub_path', 'man_path',
+                'table_path'],
+    'compile': ['feat_path', 'upos_path', 'qub_path', 'man_path'],
+    'num': ['paths'],
+    'pipeline': ['paths', 'feat_path', 'upos_path', 'qub_path', 'man_path',
+                 'table_path', 'udpipe_model'],
+    'shard': ['paths'],
+    'merge': ['paths', 'index_path'],
+    'pack': ['inp_path'],
+    'unpack': ['inp_path'],
+    'stats': ['paths', 'pdb_paths'],
+}
+OUTPUT_ARGS = {
+    'parse': ['out_path'],
+    'align': ['out_path'],
+    'tagset': ['save_counts_path', 'upos_path', 'feat_path'],
+    'convert': ['out_path'],
+    'compile': ['table_path'],
+    'num': ['out_path'],
+    'pipeline': ['out_path'],
+    'merge': ['out_path'],
+    'pack': ['out_path'],
+    'unpack': ['out_path'],
+    'stats': ['out_path'],
+}
+
+MANIFEST_VERSION = 1
+
+
+class Target(typing.NamedTuple):
+    """Build target: a main.py command line with its input/output files."""
+    argv: List[str]
+    args: argparse.Namespace
+    inputs: List[str]
+    outputs: List[str]
+
+    @property
+    def key(self) -> str:
+        return " ".join(self.outputs)
+
+
+def arg_paths(args: argparse.Namespace, dests: List[str]) -> List[str]:
+    """Collect the file paths of the given arguments."""
+    paths = []
+    for dest in dests:
+        value = getattr(args, dest, None)
+        if isinstance(value, list):
+            paths.extend(value)
+        elif value is not None:
+            paths.append(value)
+    return paths
+
+
+def mk_target(argv: List[str]) -> Target:
+    """Determine the build target of the given main.py command line."""
+    args = mk_arg_parser().parse_args(argv)
+    if args.command == 'index':
+        args.command = 'pack'  # alias
+    if args.command == 'split':
+        outputs = [args.out_dir + "/" + src + ".cupt" for src in ORIG_IDS]
+    elif args.command == 'shard':
+        outputs = [shard_path(args.out_dir, shard)
+                   for shard in range(args.shard_num)]
+        outputs.append(args.out_dir + "/" + SHARD_INDEX)
+    else:
+        outputs = arg_paths(args, OUTPUT_ARGS.get(args.command, []))
+    if not outputs:
+        raise Exception(f"build command without output files: {argv}")
+    inputs = arg_paths(args, INPUT_ARGS[args.command])
+    if args.command == 'tagset':
+        # --upos and --feats are outputs here
+        inputs = arg_paths(args, ['paths', 'counts_paths'])
+    return Target(argv, args, inputs, outputs)
+
+
+def strip_comment(line: str) -> str:
+    """Remove the comment from the (shell-like) line: from a `#` at the
+    start of a word, outside quotes.
+    """
+    quote, escaped = None, False
+    for i, char in enumerate(line):
+        if escaped:
+            escaped = False
+        elif char == "\\" and quote != "'":
+            escaped = True
+        elif quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"":
+            quote = char
+        elif char == "#" and (i == 0 or line[i - 1].isspace()):
+            return line[:i]
+    return line
+
+
+def read_build_file(path: str) -> List[Target]:
+    """Read the build targets from the given file.
+
+    Each non-empty line is a main.py command line (without `python3
+    main.py`), `#` starts a comment (see `strip_comment`).  Lines of the form `NAME=value` define
+    variables, referred to as `$NAME` in the subsequent lines.  Paths with
+    wildcards are expanded.  Targets are built in the order of the file.
+    """
+    import glob
+    import shlex
+    import string
+    variables: Dict[str, str] = {}
+    targets = []
+    with open(path, encoding="utf-8") as build_file:
+        for line in build_file:
+            line = strip_comment(line).strip()
+            if not line:
+                continue
+            line = string.Template(line).substitute(variables)
+            name, eq, value = line.partition("=")
+            if eq and name.isidentifier():
+                variables[name] = value.strip()
+                continue
+            argv = []
+            for arg in shlex.split(line):
+                argv.extend(sorted(glob.glob(arg)) or [arg])
+            targets.append(mk_target(argv))
+    return targets
+
+
+class Manifest:
+    """Digests of the inputs and outputs of the built targets.
+
+    File digests are cached by size and modification time, so that
+    unchanged files are not re-read.
+    """
+
+    def __init__(self, path: str):
+        import json
+        self.path = path
+        self.files: Dict[str, list] = dict()
+        self.targets: Dict[str, dict] = dict()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data["version"] == MANIFEST_VERSION:
+                self.files, self.targets = data["files"], data["targets"]
+
+    def digest(self, path: str) -> Optional[str]:
+        """Digest of the file, None if it does not exist."""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        size, mtime, digest = self.files.get(path, (None, None, None))
+        if (size, mtime) != (stat.st_size, stat.st_mtime_ns):
+            digest = file_digest(path)
+            self.files[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def reasons(self, target: Target, pending: Set[str]) -> List[str]:
+        """Determine why the target has to be rebuilt (if at all).
+
+        `pending` are the outputs of the preceding targets to be rebuilt.
+        """
+        import shlex
+        done = self.targets.get(target.key)
+        if done is None:
+            return ["never built"]
+        reasons = []
+        if done["argv"] != target.argv:
+            reasons.append("command changed: " + shlex.join(done["argv"]))
+        for path in target.outputs:
+            if self.digest(path) is None:
+                reasons.append(f"output {path} missing")
+            elif self.digest(path) != done["outputs"].get(path):
+                reasons.append(f"output {path} modified")
+        for path in target.inputs:
+            if path in pending:
+                reasons.append(f"input {path} is rebuilt")
+            elif path not in done["inputs"]:
+                reasons.append(f"input {path} added")
+            elif self.digest(path) is None:
+                raise Exception(f"input file {path} does not exist")
+            elif self.digest(path) != done["inputs"][path]:
+                reasons.append(f"input {path} changed")
+        for path in done["inputs"]:
+            if path not in target.inputs:
+                reasons.append(f"input {path} removed")
+        return reasons
+
+    def record(self, target: Target):
+        """Record the target as built."""
+        self.targets[target.key] = {
+            "argv": target.argv,
+            "inputs": {path: self.digest(path) for path in target.inputs},
+            "outputs": {path: self.digest(path) for path in target.outputs},
+        }
+
+    def save(self):
+        import json
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "files": self.files,
+                       "targets": self.targets}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def do_build(args):
+    targets = read_build_file(args.build_path)
+    manifest = Manifest(args.manifest_path or args.build_path + ".manifest")
+    pending: Set[str] = set()
+    for target in targets:
+        reasons = manifest.reasons(target, pending)
+        if not reasons:
+            print(f"# up to date: {target.key}", file=sys.stderr)
+            continue
+        print(f"# {'would rebuild' if args.dry_run else 'rebuilding'}: "
+              f"{target.key}", file=sys.stderr)
+        for reason in reasons:
+            print(f"#   {reason}", file=sys.stderr)
+        if args.dry_run:
+            pending.update(target.outputs)
+            continue
+        for path in target.outputs:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        run_command(target.args)
+        manifest.record(target)
+        # Save after each target, so that an interrupted build is resumed
+        manifest.save()
+    if not args.dry_run:
+        manifest.save()
+
 
 #################################################
 # MAIN
 #################################################
 
-if __name__ == '__main__':
-    parser = mk_arg_parser()
-    args = parser.parse_args()
+def run_command(args):
+    """Run the subcommand specified in the arguments."""
     if args.command == 'split':
         do_split(args)
     if args.command == 'parse':
         do_parse(args)
+    if args.command == 'serve':
+        do_serve(args)
     if args.command == 'align':
         do_align(args)
     if args.command == 'tagset':
         do_tagset(args)
     if args.command == 'convert':
         do_convert(args)
+    if args.command == 'compile':
+        do_compile(args)
+    if args.command in ('pack', 'index'):
+        do_pack(args)
+    if args.command == 'unpack':
+        do_unpack(args)
     if args.command == 'words':
         do_words(args)
+    if args.command == 'validate':
+        do_validate(args)
     if args.command == 'mwes':
         do_mwe_stats(args)
+    if args.command == 'stats':
+        do_stats(args)
     if args.command == 'num':
         do_nums(args)
+    if args.command == 'pipeline':
+        do_pipeline(args)
+    if args.command == 'build':
+        do_build(args)
+    if args.command == 'shard':
+        do_shard(args)
+    if args.command == 'merge':
+        do_merge(args)
+
+
+if __name__ == '__main__':
+    parser = mk_arg_parser()
+    args = parser.parse_args()
+    WRITE_THREAD = args.write_thread
+    if args.profile:
+        PROFILER.enable(every=args.profile_every)
+    if args.cprofile_path:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        run_command(args)
+    except BrokenPipeError:
+        # The reader of the output went away (e.g., `| head`): exit quietly,
+        # as a Unix filter, without flushing stdout again at exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(0)
+    finally:
+        if args.cprofile_path:
+            profile.disable()
+            profile.dump_stats(args.cprofile_path)
+        if args.profile:
+            PROFILER.report()
@@ -12,11 +12,5 @@ INP="$@"
 # Echo on
 set -x
 
-for xz_file in $INP
-do
-  # xz_file="$(basename -- $xz_file)"
-  file="${xz_file%.*}"
-  unxz --keep $xz_file
-  python3 main.py words -i $file
-  rm $file
-done
+# Compressed files are handled by main.py directly, and counted in parallel
+python3 main.py words -i $INP
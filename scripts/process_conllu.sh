@@ -1,8 +1,8 @@
 #!/bin/bash
 
 # Args
-if [ ! $# -eq 4 ]; then
-  echo Usage: `basename $0` 'MODEL' 'INPUT-DIR' 'TMP-DIR' 'OUTPUT-DIR'
+if [ ! $# -eq 3 ]; then
+  echo Usage: `basename $0` 'MODEL' 'INPUT-DIR' 'OUTPUT-DIR'
   echo
   exit
 fi
@@ -10,8 +10,7 @@ fi
 UDPIPE_PL=$1
 # =udpipe/models/polish-pdb-ud-2.5-191206.udpipe
 INP=$2
-TMP=$3
-OUT=$4
+OUT=$3
 
 # Echo on
 set -x
@@ -19,11 +18,6 @@ set -x
 for xz_file in $INP/*.conllu.xz
 do
   xz_file="$(basename -- $xz_file)"
-  cp $INP/$xz_file $TMP/inp.conllu.xz
-  unxz $TMP/inp.conllu.xz
-  python3 main.py parse --raw -i $TMP/inp.conllu -m $UDPIPE_PL > $TMP/out.conllu
-  xz $TMP/out.conllu
-  mv $TMP/out.conllu.xz $OUT/$xz_file
-  # Clean-up
-  rm $TMP/*conllu*
+  # Compressed input/output files are handled by main.py directly
+  python3 main.py parse --raw -i $INP/$xz_file -m $UDPIPE_PL -o $OUT/$xz_file
 done
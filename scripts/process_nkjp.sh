@@ -15,13 +15,10 @@ TO_CUPT=./utils/st-organizers/to_cupt.py
 # Determine tagset conversion maps
 # python3 main.py tagset -i $DATA/$PDB/*.conllu --upos $DATA/$OUT/upos_conv.txt --feats $DATA/$OUT/feat_conv.txt
 
-# Perform conversion
-python3 main.py convert -i $DATA/$SPLIT/NKJP.cupt --upos $CONV/upos_conv.txt --feats $CONV/feat_conv.txt --qub $CONV/qub_conv.txt --manual $CONV/manual_conv.txt > $DATA/$OUT/input.cupt
-
-# Reparse (syntax level only)
-python3 main.py parse --disable-tagger -i $DATA/$OUT/input.cupt -m $DATA/$UDPIPE_PL > $DATA/$OUT/NKJP.cupt
+# Perform conversion and reparse (syntax level only), in a single pass
+python3 main.py pipeline --no-num --disable-tagger -i $DATA/$SPLIT/NKJP.cupt --upos $CONV/upos_conv.txt --feats $CONV/feat_conv.txt --qub $CONV/qub_conv.txt --manual $CONV/manual_conv.txt -m $DATA/$UDPIPE_PL > $DATA/$OUT/NKJP.cupt
+# python3 main.py convert -i $DATA/$SPLIT/NKJP.cupt --upos $CONV/upos_conv.txt --feats $CONV/feat_conv.txt --qub $CONV/qub_conv.txt --manual $CONV/manual_conv.txt > $DATA/$OUT/input.cupt
 # python3 main.py parse --disable-tagger -i $DATA/$OUT/input.cupt -m $DATA/$UDPIPE_PL > $DATA/$OUT/udpipe.conllu
-rm $DATA/$OUT/input.cupt
 
 # # Merge the input .cupt file with UDPipe's output.
 # cd $DATA
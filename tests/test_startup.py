@@ -0,0 +1,43 @@
+"""Startup time budgets and lazy imports of the main.py subcommands (see
+`bench/bench.py startup`).
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "bench"))
+import bench  # noqa: E402
+
+
+# Runs per command (the minimum CPU time is taken)
+REPEAT = 9
+
+
+@pytest.fixture(scope="module")
+def startup_times(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp("startup")
+    return bench.startup_times(str(work_dir), None, REPEAT)
+
+
+def test_every_subcommand_measured():
+    names = {name.split()[0]
+             for name in bench.STARTUP_BUDGETS if name != "--help"}
+    assert names == set(bench.main_subcommands())
+
+
+def test_startup_budgets(startup_times):
+    assert set(startup_times) == set(bench.STARTUP_BUDGETS)
+    over = {
+        name: f"{ratio:.2f} > {bench.STARTUP_BUDGETS[name]}"
+        for name, (_spent, ratio) in startup_times.items()
+        if ratio > bench.STARTUP_BUDGETS[name]
+    }
+    assert not over, f"over the startup budget: {over}"
+
+
+def test_lazy_imports():
+    env, _model = bench.bench_env(None)
+    assert bench.eager_imports(env) == []